@@ -0,0 +1,125 @@
+"""
+Solves a range of seeded boards across a pool of processes and writes one JSON line per board.
+Every board is generated by seeding the random module with its seed, so a record can always be
+reproduced by solving the same seed again. Records are written as soon as their board is solved,
+so they come out in the order the boards finish, not in the order of the seeds.
+Boards can also be read from a corpus file written by board_format.py, in which case a range of the
+corpus indices is solved instead and each record holds the index of its board.
+Run with e.g.: python batch_solve.py --seeds 0 1000 -s 18 18 --search_method astar --heuristic admissible
+"""
+import json
+import multiprocessing
+import random
+import sys
+from time import perf_counter
+from board import Board
+from board_format import Corpus
+from heuristics import HEURISTIC_ALIASES, HEURISTICS
+from pattern_database import PatternDatabase
+from search_problems import FillProblem
+from search_algorithms import run_search_algorithm
+from search_stats import SearchStats
+from solution_cache import SolutionCache
+
+
+def make_board(seed, size, starting_point, jokers, knight):
+    """Returns the board of the given seed"""
+    random.seed(seed)
+    board = Board(size, starting_point, jokers)
+    if knight:
+        board.toggle_mode(print_message=False)
+    return board
+
+
+def solve(task):
+    """
+    Solves the board of one seed, or of one corpus index if a corpus was given
+    :param task: A (seed, options) pair, where options is the dict of the command line arguments
+    :return: The JSON record of the board
+    """
+    seed, options = task
+    if options['pattern_db']:
+        PatternDatabase.load(options['pattern_db'])
+    known = None
+    if options['corpus']:
+        board, known = Corpus.get(options['corpus']).record(seed)
+    else:
+        board = make_board(seed, options['size'], options['start_point'], options['jokers'], options['knight'])
+    # Jokers recolor cells across region boundaries, so the boards of a corpus that have them are not compressed
+    problem = FillProblem(board, options['compress'] and not board.joker_locations)
+    stats = SearchStats() if options['stats'] else None
+    cache = SolutionCache.get(options['cache']) if options['cache'] else None
+    start = perf_counter()
+    moves = run_search_algorithm(options['search'], problem, options['heuristic'],
+                                 time_limit=options['time_limit'], table_bytes=options['table_bytes'], stats=stats,
+                                 cache=cache)
+    seconds = perf_counter() - start
+    solved = isinstance(moves, list)  # The graph searches return the visited states when there is no solution
+    record = {
+        'index' if options['corpus'] else 'seed': seed,
+        'size': [board.height, board.width],
+        'jokers': board.jokers,
+        'mode': board.mode,
+        'algorithm': options['search'],
+        'heuristic': options['heuristic'],
+        'moves': ''.join(moves) if solved else None,
+        'length': len(moves) if solved else None,
+        'expanded': problem.expanded,
+        'seconds': round(seconds, 6),
+    }
+    if known is not None:
+        record['known_length'] = len(known)
+    if stats is not None:
+        record['stats'] = stats.as_dict()
+    return record
+
+
+def run(options, output):
+    """Solves every seed of the range in a pool of processes and writes the records to the output as they finish"""
+    seeds = options['seeds'] or (0, len(Corpus.get(options['corpus'])))
+    tasks = [(seed, options) for seed in range(*seeds)]
+    with multiprocessing.Pool(options['processes']) as pool:
+        for record in pool.imap_unordered(solve, tasks, chunksize=options['chunksize']):
+            output.write(json.dumps(record) + '\n')
+            output.flush()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser('Solve a range of seeded boards and write one JSON line per board')
+    parser.add_argument('--seeds', nargs=2, dest='seeds', type=int, default=None,
+                        help='first seed and end of the range, or of the corpus indices when a corpus is given')
+    parser.add_argument('--corpus', dest='corpus', type=str, default=None, help='solve the boards of a corpus file')
+    parser.add_argument('-s', '--size', nargs=2, dest='size', type=int, default=(18, 18))
+    parser.add_argument('-p', '--starting_point', nargs=2, dest='start_point', type=int, default=(0, 0))
+    parser.add_argument('-j', '--num_jokers', dest='jokers', type=int, default=0)
+    parser.add_argument('-k', '--knight', dest='knight', action='store_true')
+    parser.add_argument('--search_method', dest='search', type=str, default='astar')
+    parser.add_argument('--heuristic', dest='heuristic', type=str, default='weighted',
+                        choices=list(HEURISTICS) + list(HEURISTIC_ALIASES))
+    parser.add_argument('--compress', dest='compress', action='store_true')
+    parser.add_argument('--time_limit', dest='time_limit', type=float, default=None)
+    parser.add_argument('--table_bytes', dest='table_bytes', type=int, default=None)
+    parser.add_argument('--stats', dest='stats', action='store_true', help='add the search statistics to each record')
+    parser.add_argument('--pattern_db', dest='pattern_db', type=str, default=None,
+                        help='pattern database file of the boards, for the pdb heuristic')
+    parser.add_argument('--cache', dest='cache', type=str, default=None,
+                        help='SQLite file of known solutions, looked up before searching and updated after')
+    parser.add_argument('--processes', dest='processes', type=int, default=None)
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=1)
+    parser.add_argument('-o', '--output', dest='output', type=str, default=None, help='JSONL file, stdout by default')
+    args = parser.parse_args()
+
+    if args.seeds is None and args.corpus is None:
+        parser.error('Either --seeds or --corpus is required')
+    if args.compress and args.jokers > 0:
+        parser.error('--compress cannot be used with jokers, which recolor cells across region boundaries')
+    if args.search == 'hda':  # Pool processes cannot start worker processes of their own
+        parser.error('The parallel hda search cannot run inside the batch pool, use astar instead')
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            run(vars(args), output_file)
+    else:
+        run(vars(args), sys.stdout)
@@ -0,0 +1,44 @@
+"""
+Shows how much pruning no-op moves, and optionally forcing color-eliminating moves,
+cuts the branching factor of the searches. The solution lengths stay the same.
+Run from the repository root with: python -m benchmarks.branching
+"""
+import random
+from time import perf_counter
+from board import Board
+from search_problems import FillProblem
+from search_algorithms import run_search_algorithm
+
+SIZES = [6, 8, 10]
+SEEDS = range(3)
+ALGORITHMS = [('bfs', None), ('ucs', None), ('astar', 'admissible')]
+VARIANTS = [
+    ('all colors', {'prune': False}),
+    ('frontier', {'prune': True}),
+    ('forced', {'prune': True, 'forced_moves': True}),
+]
+
+
+def run():
+    print(f'{"algorithm":<12}{"moves":<12}{"size":>6}{"expanded":>10}{"generated":>11}{"branching":>11}'
+          f'{"length":>8}{"seconds":>9}')
+    for algorithm, heuristic in ALGORITHMS:
+        for name, kwargs in VARIANTS:
+            for size in SIZES:
+                expanded = generated = length = 0
+                seconds = 0
+                for seed in SEEDS:
+                    random.seed(seed)
+                    problem = FillProblem(Board((size, size)), **kwargs)
+                    start = perf_counter()
+                    solution = run_search_algorithm(algorithm, problem, heuristic or 'null')
+                    seconds += perf_counter() - start
+                    expanded += problem.expanded
+                    generated += problem.generated
+                    length += len(solution)
+                print(f'{algorithm:<12}{name:<12}{size:>6}{expanded:>10}{generated:>11}'
+                      f'{generated / expanded:>11.2f}{length:>8}{seconds:>9.2f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,70 @@
+"""
+Shows how the flood fill engine scales with the board size.
+Run from the repository root with: python -m benchmarks.fill_scaling
+Linear scaling shows up as a roughly constant time per filled cell.
+"""
+from time import perf_counter
+from board import Board
+from flood_fill import span_fill, work_list_fill
+from geometry import Geometry
+
+SIZES = [125, 250, 500, 1000]
+
+
+def uniform_grid(size):
+    """A single-color board, so the fill covers every cell"""
+    return [[Board.YELLOW] * size for _ in range(size)]
+
+
+def serpentine_grid(size):
+    """A one-cell-wide corridor winding through the board, the worst case for span fill"""
+    grid = []
+    for row in range(size):
+        if row % 2 == 0:
+            grid.append([Board.YELLOW] * size)
+        else:
+            wall = [Board.RED] * size
+            wall[size - 1 if row % 4 == 1 else 0] = Board.YELLOW
+            grid.append(wall)
+    return grid
+
+
+def make_board(grid):
+    board = Board((len(grid), len(grid[0])), copy=True)
+    board.board = grid
+    return board
+
+
+def time_fill(fill, board, **kwargs):
+    # The neighbor tables are built once per shape, not once per fill
+    Geometry.get(board.height, board.width, kwargs.get('knight', False)).neighbor_cells
+    start = perf_counter()
+    filled = fill(board, [board.starting_point], board.board[0][0], **kwargs)
+    return perf_counter() - start, len(filled)
+
+
+def run():
+    fills = [
+        ('span', span_fill, {}),
+        ('work list', work_list_fill, {}),
+        ('work list knight', work_list_fill, {'knight': True}),
+        ('track_conquered', None, {}),
+    ]
+    print(f'{"pattern":<12}{"fill":<18}{"size":>6}{"cells":>10}{"seconds":>10}{"ns/cell":>10}')
+    for pattern in [uniform_grid, serpentine_grid]:
+        for name, fill, kwargs in fills:
+            for size in SIZES:
+                board = make_board(pattern(size))
+                if fill is None:  # The persistent state Board.apply_color_move starts from
+                    board.geometry.neighbor_cells
+                    start = perf_counter()
+                    board.track_conquered()
+                    seconds, cells = perf_counter() - start, len(board.conquered_area)
+                else:
+                    seconds, cells = time_fill(fill, board, **kwargs)
+                print(f'{pattern.__name__[:-5]:<12}{name:<18}{size:>6}{cells:>10}{seconds:>10.3f}'
+                      f'{seconds / cells * 1e9:>10.0f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,53 @@
+"""
+Compares serial A* with hash-distributed parallel A* on hard boards, using the admissible heuristic
+over the compressed region graph. Both find solutions of the same length; the speedup depends on
+the number of cores, and the expanded counts show how evenly the hashing spreads the work.
+A worker count above the number of CPUs is still run, to check its solutions, but its speedup is not reported,
+since its workers share the CPUs and the ratio would say nothing about the parallel search.
+Run from the repository root with: python -m benchmarks.parallel_astar [size ...] [--workers count ...]
+"""
+import os
+import random
+from time import perf_counter
+from board import Board
+from search_problems import FillProblem
+from search_algorithms import run_search_algorithm
+
+SIZES = [18, 24]
+SEEDS = range(3)
+WORKERS = [1, 2, 4, 8]
+CPU_WARNING = 'WARNING: {} workers on {} CPUs, the speedups of worker counts above the number of CPUs are not reported'
+
+
+def run(sizes=SIZES, worker_counts=WORKERS):
+    cpus = os.cpu_count() or 1
+    if max(worker_counts) > cpus:
+        print(CPU_WARNING.format(max(worker_counts), cpus))
+    print(f'{"size":>5}{"seed":>5}{"workers":>9}{"length":>8}{"seconds":>9}{"speedup":>9}  expanded per worker')
+    for size in sizes:
+        for seed in SEEDS:
+            random.seed(seed)
+            board = Board((size, size))
+            problem = FillProblem(board, compress=True)
+            start = perf_counter()
+            solution = run_search_algorithm('astar', problem, 'admissible')
+            serial = perf_counter() - start
+            print(f'{size:>5}{seed:>5}{"serial":>9}{len(solution):>8}{serial:>9.2f}{1:>9.2f}  {problem.expanded}')
+            for workers in worker_counts:
+                problem = FillProblem(board, compress=True)
+                start = perf_counter()
+                solution = run_search_algorithm('hda', problem, 'admissible', workers)
+                seconds = perf_counter() - start
+                speedup = f'{serial / seconds:>9.2f}' if workers <= cpus else f'{"-":>9}'
+                print(f'{size:>5}{seed:>5}{workers:>9}{len(solution):>8}{seconds:>9.2f}{speedup}  '
+                      f'{problem.expanded_per_worker}')
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser('Compare serial A* with parallel A* on hard boards')
+    parser.add_argument('sizes', nargs='*', type=int, default=SIZES)
+    parser.add_argument('--workers', nargs='+', dest='workers', type=int, default=WORKERS)
+    args = parser.parse_args()
+    run(args.sizes, args.workers)
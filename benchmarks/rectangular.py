@@ -0,0 +1,51 @@
+"""
+Shows the cost of the board operations on non-square boards, next to square boards of about the same number of cells.
+The neighbor tables of each shape are built once before timing, as every later board of that shape shares them.
+Run from the repository root with: python -m benchmarks.rectangular
+"""
+import random
+from time import perf_counter
+from board import Board
+from geometry import Geometry
+from flood_fill import work_list_fill
+from region_graph import RegionGraph
+
+SHAPES = [(20, 10), (10, 20), (14, 14), (60, 30), (30, 120), (60, 60), (200, 100), (100, 200), (141, 141)]
+MOVES = 20
+
+
+def timed(func):
+    start = perf_counter()
+    func()
+    return perf_counter() - start
+
+
+def play(board):
+    for move in range(MOVES):
+        board.apply_color_move(Board.PALETTE[move % len(Board.PALETTE)])
+
+
+def run():
+    print(f'{"shape":<12}{"mode":<8}{"tables":>10}{"fill":>10}{"moves":>10}{"regions":>10}   (seconds)')
+    for height, width in SHAPES:
+        for knight in (False, True):
+            random.seed(0)
+            board = Board((height, width))
+            if knight:
+                board.toggle_mode(print_message=False)
+            uniform = Board((height, width), copy=True)
+            uniform.board = [[Board.YELLOW] * width for _ in range(height)]
+
+            geometry = Geometry(height, width, knight)  # A fresh geometry, so its tables are built here
+            tables = timed(lambda: (geometry.neighbor_cells, geometry.neighbors, geometry.adjacent_cells))
+            Geometry.get(height, width, knight).neighbor_cells
+
+            fill = timed(lambda: work_list_fill(uniform, [(0, 0)], Board.YELLOW, knight=knight))
+            moves = timed(lambda: play(board.copy())) / MOVES
+            regions = timed(lambda: RegionGraph(board))
+            print(f'{f"{height}x{width}":<12}{"knight" if knight else "normal":<8}'
+                  f'{tables:>10.4f}{fill:>10.4f}{moves:>10.4f}{regions:>10.4f}')
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,247 @@
+"""
+A reproducible benchmark suite over a fixed corpus of seeded boards.
+Reports microbenchmarks of the board, heuristic and data structure operations the searches are made of,
+and end-to-end metrics of every search algorithm: nodes expanded per second, peak memory and solution length.
+The results are written to a JSON file and compared against a stored baseline, and the run fails if any
+metric regressed by more than the tolerance, or if a deterministic result (nodes expanded, solution length) changed.
+Timings depend on the machine, so the baseline should be saved on the machine the suite is compared on.
+Run from the repository root with: python -m benchmarks.suite [--baseline path] [--save_baseline] [--output path]
+"""
+import json
+import os
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+from board import Board
+from data_structures import BucketQueue, PriorityQueue, Queue, Stack
+from heuristics import get_heuristic, weighted_sum_heuristic
+from search_problems import FillProblem
+from search_algorithms import anytime_search, run_search_algorithm
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+RESULTS = os.path.join(os.path.dirname(__file__), 'results.json')
+
+# name: (size, number of colors, jokers, knight mode, seed)
+CORPUS = {
+    '8x8': ((8, 8), 4, 0, False, 0),
+    '10x10': ((10, 10), 4, 0, False, 1),
+    '10x10-3colors': ((10, 10), 3, 0, False, 2),
+    '8x8-jokers': ((8, 8), 4, 3, False, 3),
+    '8x8-knight': ((8, 8), 4, 0, True, 4),
+    '18x18': ((18, 18), 4, 0, False, 5),
+    '18x18-2colors': ((18, 18), 2, 0, False, 6),
+    '50x50': ((50, 50), 4, 0, False, 7),
+}
+
+MICRO_BOARDS = ['18x18', '18x18-2colors', '50x50']
+SEARCH_BOARDS = ['8x8', '10x10', '10x10-3colors', '8x8-jokers', '8x8-knight']
+# name: (algorithm, heuristic)
+SEARCHES = {
+    'bfs': ('bfs', 'null'),
+    'dfs': ('dfs', 'null'),
+    'ucs': ('ucs', 'null'),
+    'astar-weighted': ('astar', 'weighted'),
+    'astar-admissible': ('astar', 'admissible'),
+    'ida-admissible': ('ida', 'admissible'),
+    'hda-admissible': ('hda', 'admissible'),
+    'anytime': ('anytime', 'weighted'),
+}
+ANYTIME_NODE_LIMIT = 2000  # The anytime search is given a node budget instead of a time budget, so it is reproducible
+HDA_WORKERS = 2  # Parallel A* runs with a fixed number of workers, so its results don't depend on the machine's CPUs
+# Searches whose expanded count depends on how their processes are scheduled, so it is not reported as exact
+PARALLEL_SEARCHES = ('hda',)
+DATA_STRUCT_ITEMS = 10000
+REPEAT = 5
+
+
+def make_board(name):
+    """Returns the corpus board of the given name, the same on every run"""
+    size, colors, jokers, knight, seed = CORPUS[name]
+    random.seed(seed)
+    if colors == len(Board.COLORS):
+        board = Board(size, jokers=jokers)
+    else:  # Board only draws from all of the colors, so fewer colors are drawn here
+        board = Board(size, copy=True)
+        board.board = [[random.choice(Board.PALETTE[:colors]) for _ in range(size[1])] for _ in range(size[0])]
+    if knight:
+        board.toggle_mode(print_message=False)
+    return board
+
+
+def best_time(func, repeat=REPEAT):
+    """Returns the shortest time out of several runs of the function, which is the least disturbed by noise"""
+    best = float('inf')
+    for _ in range(repeat):
+        setup = func()
+        start = perf_counter()
+        setup()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def play_moves(board):
+    """Returns a function that plays every color in turn on a fresh copy of the board, 20 moves in all"""
+    copy = board.copy()
+
+    def run():
+        for move in range(20):
+            copy.apply_color_move(Board.PALETTE[move % len(Board.PALETTE)])
+    return run
+
+
+def search_states(board):
+    """
+    Returns a function that evaluates the weighted sum heuristic on 20 fresh search states along a game, as the
+    searches do. The states are built anew for every run, so none of them has its ConqueredStats cached
+    """
+    state = FillProblem(board).get_start_state()
+    states = []
+    for move in range(20):
+        moves = state.moves()
+        state = state.successor(moves[move % len(moves)])
+        states.append(state)
+    return lambda: [weighted_sum_heuristic(state) for state in states]
+
+
+def micro_benchmarks():
+    """Returns the nanoseconds per operation of each microbenchmark"""
+    results = {}
+    for name in MICRO_BOARDS:
+        board = make_board(name)
+        results[f'apply_color_move/{name}'] = best_time(lambda: play_moves(board)) / 20
+        results[f'copy/{name}'] = best_time(lambda: lambda: [board.copy() for _ in range(20)]) / 20
+        results[f'weighted_sum_heuristic/{name}'] = best_time(lambda: search_states(board)) / 20
+
+    rng = random.Random(0)
+    priorities = [rng.randrange(100) for _ in range(DATA_STRUCT_ITEMS)]
+    for data_struct in [Queue, Stack, PriorityQueue, BucketQueue]:
+        def push_all():
+            struct = data_struct()
+            return lambda: [struct.push(index, priority) for index, priority in enumerate(priorities)]
+
+        def pop_all():
+            struct = data_struct()
+            for index, priority in enumerate(priorities):
+                struct.push(index, priority)
+            return lambda: [struct.pop() for _ in priorities]
+        results[f'push/{data_struct.__name__}'] = best_time(push_all) / DATA_STRUCT_ITEMS
+        results[f'pop/{data_struct.__name__}'] = best_time(pop_all) / DATA_STRUCT_ITEMS
+    return {key: {'ns_per_op': round(seconds * 1e9, 1)} for key, seconds in results.items()}
+
+
+def solve(board, algorithm, heuristic):
+    """Returns the problem and the solution of one search"""
+    problem = FillProblem(board)
+    if algorithm == 'anytime':
+        solution = None
+        for solution in anytime_search(problem, get_heuristic(heuristic), node_limit=ANYTIME_NODE_LIMIT):
+            pass
+    else:
+        solution = run_search_algorithm(algorithm, problem, heuristic, workers=HDA_WORKERS)
+    return problem, solution
+
+
+def search_benchmarks():
+    """Returns the end-to-end metrics of each search on each board"""
+    results = {}
+    for search, (algorithm, heuristic) in SEARCHES.items():
+        for name in SEARCH_BOARDS:
+            board = make_board(name)
+            seconds = float('inf')
+            for _ in range(3):  # The searches are deterministic, so only the timing differs between runs
+                start = perf_counter()
+                problem, solution = solve(board, algorithm, heuristic)
+                seconds = min(seconds, perf_counter() - start)
+
+            tracemalloc.start()  # Measured on a second run, since tracing slows the search down
+            solve(board, algorithm, heuristic)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            entry = {
+                'seconds': round(seconds, 4),
+                'nodes_per_second': round(problem.expanded / seconds),
+                'peak_kib': round(peak / 1024),  # Of this process only, the workers of a parallel search are left out
+                'expanded': problem.expanded,
+                'length': len(solution) if isinstance(solution, list) else None,
+            }
+            if algorithm in PARALLEL_SEARCHES:  # Reported under a name that compare() does not check exactly
+                entry['workers'] = HDA_WORKERS
+                entry['expanded_any_order'] = entry.pop('expanded')
+            results[f'{search}/{name}'] = entry
+    return results
+
+
+def run_suite():
+    return {'micro': micro_benchmarks(), 'search': search_benchmarks()}
+
+
+# metric: (True if higher is better, whether it must match exactly). The seconds of a search are only reported,
+# since nodes_per_second already compares its speed
+METRICS = {
+    'ns_per_op': (False, False),
+    'nodes_per_second': (True, False),
+    'peak_kib': (False, False),
+    'expanded': (False, True),
+    'length': (False, True),
+}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns a list of the regressions of the results against the baseline
+    :param tolerance: The fraction by which a timing or memory metric may get worse before it counts as a regression
+    """
+    regressions = []
+    for group, entries in baseline.items():
+        for key, metrics in entries.items():
+            current = results.get(group, {}).get(key)
+            if current is None:
+                regressions.append(f'{group}/{key}: missing')
+                continue
+            for metric, old in metrics.items():
+                if metric not in METRICS:
+                    continue
+                new = current.get(metric)
+                higher_is_better, exact = METRICS[metric]
+                if exact:
+                    regressed = new != old
+                elif higher_is_better:
+                    regressed = new < old * (1 - tolerance)
+                else:
+                    regressed = new > old * (1 + tolerance)
+                if regressed:
+                    regressions.append(f'{group}/{key} {metric}: {old} -> {new}')
+    return regressions
+
+
+def print_results(results):
+    for group, entries in results.items():
+        print(f'[{group}]')
+        for key, metrics in entries.items():
+            print(f'  {key:<36}' + ''.join(f'{metric}={value}  ' for metric, value in metrics.items()))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser('Run the benchmark suite and compare it against a baseline')
+    parser.add_argument('--output', dest='output', type=str, default=RESULTS)
+    parser.add_argument('--baseline', dest='baseline', type=str, default=BASELINE)
+    parser.add_argument('--save_baseline', dest='save_baseline', action='store_true')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, default=0.5)
+    args = parser.parse_args()
+
+    suite_results = run_suite()
+    print_results(suite_results)
+    with open(args.baseline if args.save_baseline else args.output, 'w') as results_file:
+        json.dump(suite_results, results_file, indent=2)
+
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            found = compare(suite_results, json.load(baseline_file), args.tolerance)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        print(f'{len(found)} regressions against {args.baseline}')
+        sys.exit(1 if found else 0)
@@ -0,0 +1,449 @@
+from board import Board
+from geometry import ADJACENT_OFFSETS, KNIGHT_OFFSETS
+from heuristics import ConqueredStats
+from region_graph import RegionGraph
+from zobrist import ZobristTable
+
+
+class BitGeometry:
+    """
+    Precomputed shift data for flooding a bitboard of a given (height, width, mode).
+    Cell (row, col) is stored in bit (row * width + col). Moving a whole mask by a
+    neighbor offset is a single shift, after which the destination mask clears any
+    bits that wrapped around the left/right edge of the board or fell off the bottom.
+    Geometries are immutable and cached, so every BitBoard of the same shape shares one.
+    """
+
+    ADJACENT_OFFSETS = ADJACENT_OFFSETS
+    KNIGHT_OFFSETS = KNIGHT_OFFSETS
+
+    _cache = {}
+
+    def __init__(self, height, width, mode):
+        self.height = height
+        self.width = width
+        self.mode = mode
+        self.size = height * width
+        self.full = (1 << self.size) - 1
+        offsets = BitGeometry.KNIGHT_OFFSETS if mode == Board.KNIGHT else BitGeometry.ADJACENT_OFFSETS
+        self.shifts = [self._shift_for(d_row, d_col) for d_row, d_col in offsets]
+        self.adjacent_shifts = [self._shift_for(d_row, d_col) for d_row, d_col in BitGeometry.ADJACENT_OFFSETS]
+
+    @classmethod
+    def get(cls, height, width, mode):
+        """Returns the shared geometry for the given shape and mode"""
+        key = (height, width, mode)
+        if key not in cls._cache:
+            cls._cache[key] = cls(height, width, mode)
+        return cls._cache[key]
+
+    def column_mask(self, first, last):
+        """Returns a mask with every cell whose column is in the range [first, last] set"""
+        if first > last:
+            return 0
+        row_bits = ((1 << (last - first + 1)) - 1) << first
+        mask = 0
+        for row in range(self.height):
+            mask |= row_bits << (row * self.width)
+        return mask
+
+    def _shift_for(self, d_row, d_col):
+        """
+        Returns the (shift, destination mask) pair that moves every cell by the given offset.
+        A positive shift moves towards higher bits, a negative shift towards lower bits.
+        """
+        shift = d_row * self.width + d_col
+        valid_cols = self.column_mask(max(d_col, 0), self.width - 1 + min(d_col, 0))
+        return shift, valid_cols & self.full
+
+    def bit(self, row, col):
+        return 1 << (row * self.width + col)
+
+    @staticmethod
+    def _dilate(mask, shifts):
+        result = 0
+        for shift, valid in shifts:
+            if shift > 0:
+                result |= (mask << shift) & valid
+            else:
+                result |= (mask >> -shift) & valid
+        return result
+
+    def dilate(self, mask):
+        """Returns all cells that neighbor a cell in the mask according to the geometry mode"""
+        return BitGeometry._dilate(mask, self.shifts)
+
+    def dilate_adjacent(self, mask):
+        """Returns all cells that are immediately adjacent to a cell in the mask, regardless of mode"""
+        return BitGeometry._dilate(mask, self.adjacent_shifts)
+
+    def flood(self, seed, allowed):
+        """
+        Grows the seed through the allowed cells until it stops changing
+        :param seed: A mask of the cells to start from
+        :param allowed: A mask of the cells the fill may pass through
+        :return: A mask of all of the cells reachable from the seed
+        """
+        shifts = self.shifts
+        remaining = allowed & ~seed
+        frontier = seed
+        while frontier:
+            grown = 0
+            for shift, valid in shifts:  # Inlined dilate(), this loop is the hot path of every fill
+                if shift > 0:
+                    grown |= (frontier << shift) & valid
+                else:
+                    grown |= (frontier >> -shift) & valid
+            frontier = grown & remaining
+            remaining ^= frontier
+        return (allowed & ~remaining) | seed
+
+    def cells(self, mask):
+        """Yields the (row, col) pair of every set bit in the mask"""
+        while mask:
+            low = mask & -mask
+            index = low.bit_length() - 1
+            yield divmod(index, self.width)
+            mask ^= low
+
+
+class BitBoard:
+    """
+    A Board replacement that stores one integer bitmask per color instead of a grid of chars.
+    It exposes the same interface used by the search code (copy, apply_color_move, full_board, ...),
+    so it can be handed to FillProblem in place of a Board.
+    """
+
+    COLORS = Board.COLORS
+
+    def __init__(self, size, starting_point, masks, joker_mask=0, mode=Board.NORMAL):
+        self.height, self.width = size
+        self.starting_point = tuple(starting_point)
+        self.masks = tuple(masks)  # Indexed in the order of Board.PALETTE
+        self.joker_mask = joker_mask
+        self.mode = mode
+        self.geometry = BitGeometry.get(self.height, self.width, mode)
+        self.graph = None  # The RegionGraph of the colors, built on demand by region_graph()
+
+    @classmethod
+    def from_board(cls, board):
+        """Builds a BitBoard holding the same position as the given Board"""
+        geometry = BitGeometry.get(board.height, board.width, board.mode)
+        masks = [0] * len(Board.PALETTE)
+        for row in range(board.height):
+            for col in range(board.width):
+                masks[Board.PALETTE.index(board.color_at(row, col))] |= geometry.bit(row, col)
+        joker_mask = 0
+        for row, col in board.joker_locations:
+            joker_mask |= geometry.bit(row, col)
+        return cls((board.height, board.width), board.starting_point, masks, joker_mask, board.mode)
+
+    def to_board(self):
+        """Returns a Board holding the same position as this BitBoard"""
+        board = Board((self.height, self.width), self.starting_point, jokers=bin(self.joker_mask).count('1'), copy=True)
+        board.board = [[self.color_at(row, col) for col in range(self.width)] for row in range(self.height)]
+        board.mode = self.mode
+        board.joker_locations = set(self.geometry.cells(self.joker_mask))
+        return board
+
+    def copy(self):
+        return BitBoard((self.height, self.width), self.starting_point, self.masks, self.joker_mask, self.mode)
+
+    def toggle_mode(self, print_message=True):
+        """Toggles the game mode between normal and knight"""
+        if self.mode == Board.NORMAL:
+            if print_message:
+                print(Board.KNIGHT_MODE_ON_MSG)
+            self.mode = Board.KNIGHT
+        else:
+            if print_message:
+                print(Board.KNIGHT_MODE_OFF_MSG)
+            self.mode = Board.NORMAL
+        self.geometry = BitGeometry.get(self.height, self.width, self.mode)
+        self.graph = None
+
+    def region_graph(self):
+        """Returns the RegionGraph of the board's colors, ignoring any jokers"""
+        if self.graph is None:
+            plain = BitBoard((self.height, self.width), self.starting_point, self.masks, 0, self.mode)
+            self.graph = RegionGraph(plain.to_board())
+        return self.graph
+
+    def color_index_at(self, row, col):
+        bit = self.geometry.bit(row, col)
+        for index, mask in enumerate(self.masks):
+            if mask & bit:
+                return index
+
+    def color_at(self, row, col):
+        return Board.PALETTE[self.color_index_at(row, col)]
+
+    def conquered(self):
+        """Returns a mask of the cells connected to the starting point through its own color"""
+        row, col = self.starting_point
+        return self.geometry.flood(self.geometry.bit(row, col), self.masks[self.color_index_at(row, col)])
+
+    def conquered_cells(self):
+        """Returns the 'conquered' area as a set of (row, col) tuples"""
+        return set(self.geometry.cells(self.conquered()))
+
+    def conquered_stats(self):
+        """Returns the ConqueredStats of the 'conquered' area, computed from scratch"""
+        return ConqueredStats.of_cells(self.height, self.width, self.conquered_cells())
+
+    def apply_color_move(self, color):
+        """
+        Applies the given color to the board
+        :param color: A color in the form of a single char
+        :return: A sorted list of the (row, col) cells of the jokers the move triggered
+        """
+        colored = self.conquered()
+        triggered = self.joker_mask & colored
+        if triggered:  # Jokers color all of their immediate neighbors along with the conquered area
+            colored |= self.geometry.dilate_adjacent(triggered)
+            self.joker_mask &= ~triggered
+        target = Board.PALETTE.index(color)
+        self.masks = tuple(mask | colored if index == target else mask & ~colored
+                           for index, mask in enumerate(self.masks))
+        self.graph = None
+        return sorted(self.geometry.cells(triggered))
+
+    def full_board(self):
+        """
+        :return: True iff the entire board is colored the same color
+        """
+        return self.geometry.full in self.masks
+
+    def __eq__(self, other):
+        return self.masks == other.masks and self.joker_mask == other.joker_mask
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((self.masks, self.joker_mask))
+
+    def __lt__(self, other):
+        return True
+
+    def __repr__(self):
+        return f"BitBoard(size=({self.height}, {self.width}), starting_point={self.starting_point}, " \
+               f"jokers={bin(self.joker_mask).count('1')})"
+
+    def __str__(self):
+        output = ""
+        for row in range(self.height):
+            for col in range(self.width):
+                output += ' ' + self.color_at(row, col)
+            output += '\n'
+        return output
+
+
+class FillState:
+    """
+    A compact, immutable search state over a shared base BitBoard that is never modified.
+    Instead of a whole grid, a state only stores:
+        (1) conquered - a mask of the cells connected to the starting point
+        (2) color - the palette index the conquered area is currently colored
+        (3) jokers - a mask of the jokers that have not been triggered yet
+        (4) painted - None, or one mask per color followed by their union, of the cells outside the conquered
+            area that a joker recolored. These only exist in knight mode, where a joker's adjacent neighbors
+            need not be connected to the conquered area
+    Every other cell still has its color from the base board.
+    Each state also carries a 64-bit Zobrist key of its conquered cells, color and jokers, which is
+    updated from the cells that changed on every move and serves as the state's hash. The ConqueredStats
+    of the conquered area are counted from the conquered mask the first time they are asked for.
+    """
+
+    COLORS = Board.COLORS
+
+    # Zobrist values of a cell, after one value per palette color
+    CONQUERED_KEY = len(Board.PALETTE)
+    JOKER_KEY = len(Board.PALETTE) + 1
+
+    __slots__ = ('base', 'conquered', 'color', 'jokers', 'painted', 'key', 'stats', 'frontier')
+
+    def __init__(self, base, conquered, color, jokers, painted=None, key=None, stats=None):
+        self.base = base
+        self.conquered = conquered
+        self.color = color
+        self.jokers = jokers
+        self.painted = painted
+        if key is None:
+            table = FillState.zobrist_table(base)
+            row, col = base.starting_point
+            key = table.mask_key(conquered, FillState.CONQUERED_KEY) ^ table.mask_key(jokers, FillState.JOKER_KEY) ^ \
+                table.keys[row * base.width + col][color]  # The starting cell's color is the conquered color
+        self.key = key
+        self.stats = stats  # Computed by conquered_stats() when needed
+        self.frontier = None  # Computed by frontier_mask() when needed
+
+    @classmethod
+    def from_board(cls, board):
+        """Returns the state of the given Board, BitBoard or NumpyBoard position"""
+        base = board.copy() if isinstance(board, BitBoard) else BitBoard.from_board(board)
+        row, col = base.starting_point
+        return cls(base, base.conquered(), base.color_index_at(row, col), base.joker_mask)
+
+    @staticmethod
+    def zobrist_table(base):
+        return ZobristTable.get(base.height * base.width, FillState.JOKER_KEY + 1)
+
+    @property
+    def height(self):
+        return self.base.height
+
+    @property
+    def width(self):
+        return self.base.width
+
+    @property
+    def starting_point(self):
+        return self.base.starting_point
+
+    def color_mask(self, index):
+        """Returns a mask of the cells outside the conquered area that have the color of the given palette index"""
+        mask = self.base.masks[index]
+        if self.painted is not None:
+            mask = (mask & ~self.painted[-1]) | self.painted[index]
+        return mask & ~self.conquered
+
+    def frontier_mask(self):
+        """Returns a mask of the cells outside the conquered area that neighbor it, computed once per state"""
+        if self.frontier is None:
+            self.frontier = self.base.geometry.dilate(self.conquered) & ~self.conquered
+        return self.frontier
+
+    def successor(self, color):
+        """
+        Returns the state reached by playing the given color. Only masks are combined, the grid is never copied.
+        :param color: A color in the form of a single char
+        """
+        geometry = self.base.geometry
+        target = Board.PALETTE.index(color)
+        conquered = self.conquered
+        painted = self.painted
+        jokers = self.jokers
+        triggered = jokers & conquered
+        if triggered:  # Jokers color all of their immediate neighbors along with the conquered area
+            jokers &= ~triggered
+            newly_painted = geometry.dilate_adjacent(triggered) & ~conquered
+            if painted is None:
+                painted = (0,) * (len(Board.PALETTE) + 1)
+            painted = tuple(mask | newly_painted if index == target else mask & ~newly_painted
+                            for index, mask in enumerate(painted[:-1])) + (painted[-1] | newly_painted,)
+
+        table = FillState.zobrist_table(self.base)
+        start_keys = table.keys[self.base.starting_point[0] * self.base.width + self.base.starting_point[1]]
+        key = self.key ^ table.mask_key(triggered, FillState.JOKER_KEY) ^ start_keys[self.color] ^ start_keys[target]
+
+        state = FillState(self.base, conquered, target, jokers, painted, key, self.stats)
+        allowed = state.color_mask(target)
+        if triggered:  # The painted cells changed the colors around the conquered area
+            conquered = geometry.flood(conquered, allowed | conquered)
+        else:  # Only the frontier cells of the color can start the fill, and the frontier is shared by every move
+            conquered |= geometry.flood(self.frontier_mask() & allowed, allowed)
+        state.conquered = conquered
+        if conquered != self.conquered:
+            state.key ^= table.mask_key(conquered ^ self.conquered, FillState.CONQUERED_KEY)
+            state.stats = None
+        else:
+            state.frontier = self.frontier
+        if painted is not None:  # Painted cells that are now conquered are described by the conquered mask
+            if painted[-1] & ~conquered:
+                state.painted = tuple(mask & ~conquered for mask in painted)
+            else:
+                state.painted = None
+        return state
+
+    def full_board(self):
+        """
+        :return: True iff the entire board is colored the same color
+        """
+        return (self.color_mask(self.color) | self.conquered) == self.base.geometry.full
+
+    def moves(self, forced=False):
+        """
+        Returns the colors worth playing, in the order of COLORS: those present on the frontier.
+        Any other color only recolors the conquered area without absorbing a cell.
+        :param forced: If True and a color's remaining cells all border the conquered area, only that color
+        is returned, since eliminating a color right away never lengthens a solution
+        """
+        triggered = self.jokers & self.conquered
+        if triggered and self.base.geometry.dilate_adjacent(triggered) & ~self.conquered:
+            return list(self.COLORS)  # The jokers paint their neighbors on any move, even one that absorbs nothing
+        frontier = self.frontier_mask()
+        present = [index for index in range(len(Board.PALETTE)) if self.color_mask(index) & frontier]
+        if not present:  # Nothing reachable is left, only the color of the unreachable cells may still matter
+            return [color for color in self.COLORS if color != Board.PALETTE[self.color]]
+        if forced and not self.jokers:
+            for index in present:
+                if not self.color_mask(index) & ~frontier:
+                    return [Board.PALETTE[index]]
+        return [color for color in self.COLORS if Board.PALETTE.index(color) in present]
+
+    def conquered_cells(self):
+        """Returns the 'conquered' area as a set of (row, col) tuples"""
+        return set(self.base.geometry.cells(self.conquered))
+
+    def conquered_stats(self):
+        """Returns the ConqueredStats of the 'conquered' area"""
+        if self.stats is None:
+            self.stats = ConqueredStats.of_mask(self.height, self.width, self.conquered)
+        return self.stats
+
+    def pack(self):
+        """Returns the state without its base board, as a tuple that is cheap to send to another process"""
+        return self.conquered, self.color, self.jokers, self.painted, self.key, self.stats
+
+    def unpack(self, packed):
+        """Returns the state that pack() described, over the same base board as this state"""
+        return FillState(self.base, *packed)
+
+    def region_view(self):
+        """
+        Returns the RegionGraph of the base board with the masks of the regions touched by the conquered area
+        and of the regions adjacent to them. Returns None while jokers can still recolor cells, since the
+        base regions then no longer describe the position.
+        """
+        if self.jokers or self.painted is not None:
+            return None
+        graph = self.base.region_graph()
+        conquered = graph.regions_touching(self.conquered)
+        return graph, conquered, graph.frontier_of(conquered)
+
+    @property
+    def whole_region_moves(self):
+        """
+        True iff every move absorbs whole regions of the base board's RegionGraph, so the region view of a
+        successor follows from this state's. Cells recolored by jokers leave regions partly conquered.
+        """
+        return not self.base.joker_mask
+
+    def to_board(self):
+        """Returns a Board holding the position this state describes"""
+        masks = [self.color_mask(index) for index in range(len(Board.PALETTE))]
+        masks[self.color] |= self.conquered
+        bit_board = BitBoard((self.height, self.width), self.starting_point, masks, self.jokers, self.base.mode)
+        return bit_board.to_board()
+
+    def __eq__(self, other):
+        return self.key == other.key and self.conquered == other.conquered and self.color == other.color and \
+            self.jokers == other.jokers and self.painted == other.painted
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        if self.painted is None:
+            return self.key
+        return hash((self.key, self.painted))
+
+    def __lt__(self, other):
+        return True
+
+    def __repr__(self):
+        return f"FillState(conquered={bin(self.conquered).count('1')}, color={Board.PALETTE[self.color]})"
+
+    def __str__(self):
+        return str(self.to_board())
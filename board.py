@@ -1,7 +1,9 @@
 from random import choice, sample, seed
 from copy import deepcopy
-from search_algorithms import depth_first_search
-from search_problems import FindConqueredProblem
+from flood_fill import flood_fill
+from geometry import Geometry
+from heuristics import ConqueredStats
+from zobrist import ZobristTable
 
 # seed(2)
 
@@ -12,10 +14,13 @@ class Board:
     GREEN = 'G'
     RED = 'R'
     COLORS = [YELLOW, BLUE, GREEN, RED]
+    PALETTE = (YELLOW, BLUE, GREEN, RED)  # Fixed color order for compact encodings, COLORS may be reordered
     NORMAL = 'N'
     KNIGHT = 'K'
     KNIGHT_MODE_ON_MSG = 'Knight mode toggled on!'
     KNIGHT_MODE_OFF_MSG = 'Knight mode toggled off!'
+    JOKER_FOUND_MSG = 'Joker found at cell ({}, {})!'
+    JOKER_KEY = len(PALETTE)  # The Zobrist value of a cell holding a joker that has not been triggered yet
 
     def __init__(self, size=(18, 18), starting_point=(0, 0), jokers=0, copy=False):
         self.height, self.width = size
@@ -31,25 +36,53 @@ class Board:
             self.board = self.__init_random_board()
 
         self.jokers = int(jokers)
-        if jokers > 0:
-            self.joker_locations = self.__init_random_jokers()
-        self.mode = Board.NORMAL
+        # The jokers not yet triggered. A copy assigns its own, so none are drawn from the random generator for it
+        self.joker_locations = self.__init_random_jokers() if jokers > 0 and not copy else set()
+        self.mode = Board.NORMAL  # Also sets self.geometry, the shared neighbor tables of the board's shape and mode
+
+        # Persistent 'conquered' state, built lazily by track_conquered() and updated by every move
+        self.conquered_area = None  # A set of the (row, col) cells connected to the starting point
+        self.frontier = None  # A dict from each color to the cells of that color bordering the conquered area
+        self.stats = None  # The ConqueredStats of the conquered area
+        self.zobrist = None  # A 64-bit hash of the cells and jokers, computed by __hash__ and updated by every move
 
     def copy(self):
         new_board = Board((self.height, self.width), self.starting_point, self.jokers, copy=True)
         new_board.board = deepcopy(self.board)
         new_board.mode = self.mode
-        if self.jokers > 0:
-            new_board.joker_locations = deepcopy(self.joker_locations)
+        new_board.joker_locations = set(self.joker_locations)
+        if self.conquered_area is not None:
+            new_board.conquered_area = set(self.conquered_area)
+            new_board.frontier = {color: set(cells) for color, cells in self.frontier.items()}
+            new_board.stats = self.stats
+        new_board.zobrist = self.zobrist
         return new_board
 
+    @property
+    def mode(self):
+        return self.__mode
+
+    @mode.setter
+    def mode(self, mode):
+        self.__mode = mode
+        self.update_geometry()
+
+    def update_geometry(self):
+        """Fetches the neighbor tables of the board's current shape and mode. Must be called whenever either changes"""
+        self.geometry = Geometry.get(self.height, self.width, self.__mode == Board.KNIGHT)
+
     def transpose_board(self):
         """Returns a copy of the transposed board"""
         rotated_board = [[self.board[j][i] for j in range(self.height)] for i in range(self.width)]
         new_board = self.copy()
         new_board.width = self.height
         new_board.height = self.width
+        new_board.update_geometry()
         new_board.board = rotated_board
+        new_board.joker_locations = {(col, row) for row, col in self.joker_locations}
+        new_board.starting_point = (self.starting_point[1], self.starting_point[0])
+        new_board.reset_conquered()
+        new_board.zobrist = None
         return new_board
 
     def toggle_mode(self, print_message=True):
@@ -62,13 +95,14 @@ class Board:
             if print_message:
                 print(Board.KNIGHT_MODE_OFF_MSG)
             self.mode = Board.NORMAL
+        self.reset_conquered()  # The neighborhood changed, so the conquered area must be rediscovered
 
     def __init_random_jokers(self):
         """
         Initializes the stored number of jokers and places them across the board
         """
         cells = [(row, col) for row in range(self.height) for col in range(self.width)]
-        return sample(cells, self.jokers)
+        return set(sample(cells, self.jokers))
 
     def __init_random_board(self):
         """
@@ -84,6 +118,10 @@ class Board:
         return board
 
     def __eq__(self, other):
+        if hash(self) != hash(other):  # Different hashes mean some cell differs, so only collisions are compared
+            return False
+        if self.joker_locations != other.joker_locations:
+            return False
         for row in range(self.height):
             for col in range(self.width):
                 if self.board[row][col] != other.board[row][col]:
@@ -93,8 +131,31 @@ class Board:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def zobrist_keys(self):
+        """Returns the Zobrist keys of the board's cells, one per palette color followed by one for a joker"""
+        return ZobristTable.get(self.height * self.width, Board.JOKER_KEY + 1).keys
+
     def __hash__(self):
-        return hash(str(self.board))
+        if self.zobrist is None:
+            keys = self.zobrist_keys()
+            self.zobrist = 0
+            for row in range(self.height):
+                for col in range(self.width):
+                    self.zobrist ^= keys[row * self.width + col][Board.PALETTE.index(self.board[row][col])]
+            for row, col in self.joker_locations:
+                self.zobrist ^= keys[row * self.width + col][Board.JOKER_KEY]
+        return self.zobrist
+
+    def __recolor(self, cells, color):
+        """Colors all of the given (row, col) cells, updating the Zobrist hash if it is being kept"""
+        if self.zobrist is not None:
+            keys = self.zobrist_keys()
+            new_index = Board.PALETTE.index(color)
+            for row, col in cells:
+                cell_keys = keys[row * self.width + col]
+                self.zobrist ^= cell_keys[Board.PALETTE.index(self.board[row][col])] ^ cell_keys[new_index]
+        for row, col in cells:
+            self.board[row][col] = color
 
     def __lt__(self, other):
         return True
@@ -114,21 +175,95 @@ class Board:
         """
         :return: True iff the entire board is colored the same color
         """
-        color = self.board[self.height - 1][self.width - 1]  # Arbitrarily choose a color to check
+        if self.conquered_area is None:
+            self.track_conquered()
+        if len(self.conquered_area) == self.height * self.width:
+            return True
+        if any(self.frontier.values()):  # Frontier cells never share the conquered color
+            return False
+
+        # The neighborhood graph is disconnected (e.g. knight mode on a tiny board), so check the remaining cells
+        color = self.board[self.starting_point[0]][self.starting_point[1]]
         for row in range(self.height):
             for col in range(self.width):
                 if self.board[row][col] != color:
                     return False
         return True
 
+    def track_conquered(self):
+        """Builds the persistent conquered area and frontier from scratch"""
+        self.conquered_area = set()
+        self.frontier = {color: set() for color in Board.PALETTE}
+        self.stats = ConqueredStats(self.height, self.width)
+        self.__absorb([self.starting_point], self.board[self.starting_point[0]][self.starting_point[1]])
+
+    def reset_conquered(self):
+        """Drops the persistent conquered state. Must be called whenever the board is changed outside of a move"""
+        self.conquered_area = None
+        self.frontier = None
+        self.stats = None
+
+    def __absorb(self, cells, color):
+        """
+        Adds the given cells, all of the given color, to the conquered area along with every cell reachable
+        from them through that color. The frontier is updated with the neighbors of each newly conquered cell.
+        """
+        new_cells = flood_fill(self, cells, color, self.conquered_area, self.mode == Board.KNIGHT)
+        self.stats = self.stats.absorb(new_cells, lambda row, col: (row, col) in self.conquered_area)
+        self.conquered_area |= new_cells
+        self.frontier[color] -= new_cells
+        neighbor_table, width = self.geometry.neighbor_cells, self.width
+        for row, col in new_cells:
+            for neighbor in neighbor_table[row * width + col]:
+                if neighbor not in self.conquered_area:
+                    self.frontier[self.board[neighbor[0]][neighbor[1]]].add(neighbor)
+
+    def __remove_jokers(self, cells):
+        """Removes the given jokers from the board, updating the Zobrist hash if it is being kept"""
+        if self.zobrist is not None:
+            keys = self.zobrist_keys()
+            for row, col in cells:
+                self.zobrist ^= keys[row * self.width + col][Board.JOKER_KEY]
+        self.joker_locations -= cells  # disallow multiple discovery
+
+    def __trigger_jokers(self):
+        """
+        Removes every joker inside the conquered area. Nothing is printed, the caller reports the jokers if it wants to
+        :return: A (triggered, painted) pair of the set of jokers that were removed, and the set of the cells
+        outside the conquered area adjacent to one of them
+        """
+        triggered = self.joker_locations & self.conquered_area
+        painted = set()
+        for row, col in triggered:
+            painted.update(self.find_adjacent_neighbors(row, col))
+        self.__remove_jokers(triggered)
+        return triggered, painted - self.conquered_area
+
     def apply_color_move(self, color):
         """
-        Applies the given color to the board
+        Applies the given color to the board. Only the frontier cells of the new color, and the cells
+        reachable from them, are visited to extend the conquered area.
         :param color: A color in the form of a single char
+        :return: A sorted list of the (row, col) cells of the jokers the move triggered
         """
-        # all_neighbors = self.find_extended_neighbors_search()
-        all_neighbors = self.find_extended_neighbors(self.starting_point[0], self.starting_point[1], {self.starting_point})
-        self.color_neighbors(all_neighbors, color)
+        if self.conquered_area is None:
+            self.track_conquered()
+
+        seeds = set(self.frontier[color])
+        triggered = set()
+        if self.joker_locations:
+            triggered, painted = self.__trigger_jokers()
+            for row, col in painted:
+                old_color = self.board[row][col]
+                if (row, col) in self.frontier[old_color]:  # Painted cells bordering the area are conquered now
+                    self.frontier[old_color].remove((row, col))
+                    seeds.add((row, col))
+            self.__recolor(painted, color)
+
+        self.__recolor(self.conquered_area, color)
+        if seeds:
+            self.__absorb(seeds, color)
+        return sorted(triggered)
 
     def find_extended_neighbors(self, row, col, neighbors_list):
         """
@@ -138,30 +273,45 @@ class Board:
         :param neighbors_list: A set containing all of the neighbors found thusfar
         :return: A set of the all of the neighbors starting from the starting point of the same color
         """
-        for neigh_row, neigh_col in self.find_neighbors(row, col):
+        target_color = self.board[self.starting_point[0]][self.starting_point[1]]
+        stack = [(row, col)]  # An explicit work list, so large areas do not hit the recursion limit
+        while stack:
+            row, col = stack.pop()
+            for neigh_row, neigh_col in self.find_neighbors(row, col):
 
-            # If the neighbor is the right color and has not yet been visited (i.e added to the neighbors list)
-            if self.board[neigh_row][neigh_col] == self.board[self.starting_point[0]][self.starting_point[1]] and \
-                    (neigh_row, neigh_col) not in neighbors_list:
+                # If the neighbor is the right color and has not yet been visited (i.e added to the neighbors list)
+                if self.board[neigh_row][neigh_col] == target_color and (neigh_row, neigh_col) not in neighbors_list:
 
-                # If the cell we are looking at is a joker cell
-                if self.jokers > 0 and (neigh_row, neigh_col) in self.joker_locations:
-                    print(f'Joker found at cell ({neigh_row}, {neigh_col})!')
+                    # If the cell we are looking at is a joker cell
+                    if (neigh_row, neigh_col) in self.joker_locations:
 
-                    # Add all immediate neighbors to the list of cells to be colored
-                    for neighbor in self.find_adjacent_neighbors(neigh_row, neigh_col):
-                        neighbors_list.add(neighbor)
-                    self.joker_locations.remove((neigh_row, neigh_col))  # disallow multiple discovery
+                        # Add all immediate neighbors to the list of cells to be colored
+                        for neighbor in self.find_adjacent_neighbors(neigh_row, neigh_col):
+                            neighbors_list.add(neighbor)
+                        self.__remove_jokers({(neigh_row, neigh_col)})
 
-                neighbors_list.add((neigh_row, neigh_col))
-                self.find_extended_neighbors(neigh_row, neigh_col, neighbors_list)
+                    neighbors_list.add((neigh_row, neigh_col))
+                    stack.append((neigh_row, neigh_col))
 
         return neighbors_list
 
+    def conquered_cells(self):
+        """Returns the 'conquered' area as a set of (row, col) tuples. The set is the board's own and must not be modified"""
+        if self.conquered_area is None:
+            self.track_conquered()
+        return self.conquered_area
+
+    def conquered_stats(self):
+        """Returns the running ConqueredStats of the 'conquered' area"""
+        if self.conquered_area is None:
+            self.track_conquered()
+        return self.stats
+
     def find_extended_neighbors_search(self):
-        """Finds the extended neighbors of the starting point. Does so using DFS search"""
+        """Finds the extended neighbors of the starting point. Does so using the FindConqueredProblem graph"""
+        from search_problems import FindConqueredProblem
         problem = FindConqueredProblem(self, self.mode == Board.KNIGHT)
-        return depth_first_search(problem)
+        return problem.conquered()
 
     def color_neighbors(self, neighbors, color):
         """
@@ -172,50 +322,35 @@ class Board:
         for row, col in neighbors:
             self.color_one_square(row, col, color)
 
+    def color_at(self, row, col):
+        return self.board[row][col]
+
     def color_one_square(self, row, col, color):
-        self.board[row][col] = color
+        self.__recolor([(row, col)], color)
+        self.reset_conquered()
 
     def find_neighbors(self, row, col):
         """
         Given the coordinates of a target square, finds the neighbors based on the stored mode.
         Possible modes are 'regular' and 'knight'
         """
-        if self.mode == Board.KNIGHT:
-            return self.find_knight_neighbors(row, col)
-        else:
-            return self.find_adjacent_neighbors(row, col)
+        return self.geometry.neighbor_cells[row * self.width + col]
 
     def find_knight_neighbors(self, row, col):
         """
-        Given the coordinates of a square, finds a list of all of the knight neighbors on the board
-        :param row: The X-coordinate of the target square
-        :param col: The Y-coordinate of the target square
-        :return: A list of (x, y) tuples representing all adjacent neighbors
+        Given the coordinates of a square, finds all of the knight neighbors on the board
+        :param row: The Row-coordinate of the target square
+        :param col: The Column-coordinate of the target square
+        :return: A tuple of (row, col) tuples representing all knight neighbors
         """
-        neighbors = [
-            (row - 1, col - 2), (row - 1, col + 2), (row - 2, col - 1), (row - 2, col + 1),
-            (row + 1, col - 2), (row + 1, col + 2), (row + 2, col - 1), (row + 2, col + 1)
-        ]
-        output = []
-        for row, col in neighbors:
-            if 0 <= row < self.width and 0 <= col < self.height:
-                output.append((row, col))
-        return output
+        geometry = self.geometry if self.geometry.knight else Geometry.get(self.height, self.width, True)
+        return geometry.neighbor_cells[row * self.width + col]
 
     def find_adjacent_neighbors(self, row, col):
         """
-        Given the coordinates of a square, finds a list of all of the adjacent neighbors on the board
+        Given the coordinates of a square, finds all of the adjacent neighbors on the board
         :param row: The Row-coordinate of the target square
         :param col: The Column-coordinate of the target square
-        :return: A list of (row, col) tuples representing all adjacent neighbors
-        """
-        neighbors = []
-        if row > 0:
-            neighbors.append((row - 1, col))
-        if row < self.width - 1:
-            neighbors.append((row + 1, col))
-        if col > 0:
-            neighbors.append((row, col - 1))
-        if col < self.height - 1:
-            neighbors.append((row, col + 1))
-        return neighbors
+        :return: A tuple of (row, col) tuples representing all adjacent neighbors
+        """
+        return self.geometry.adjacent_cells[row * self.width + col]
@@ -0,0 +1,186 @@
+"""
+A compact binary format for boards, and a corpus file of many boards that is read through mmap.
+A board record stores 2 bits per cell, its palette index, along with its size, starting point, mode,
+jokers and an optional known solution, also at 2 bits per move:
+    header - height, width, start row, start col (u16 each), flags (u8), number of jokers, solution length (u32 each)
+    cells - height * width 2-bit palette indices, 4 per byte, row by row
+    jokers - the flat index (row * width + col) of every joker as a u32
+    solution - 2-bit palette indices, 4 per byte
+A corpus file is a header, the records one after the other and an index of the offset of every record,
+so a board is decoded only when it is asked for, and opening a corpus of millions of boards takes no time.
+Build a corpus of seeded boards with e.g.: python board_format.py --seeds 0 1000000 -s 18 18 -o corpus.bin
+"""
+import mmap
+import struct
+from array import array
+from itertools import chain
+from board import Board
+
+RECORD_HEADER = struct.Struct('<HHHHBII')
+CORPUS_HEADER = struct.Struct('<8sHQQ')  # Magic, version, number of boards, offset of the index
+OFFSET = struct.Struct('<Q')
+MAGIC = b'FLOODBRD'
+VERSION = 1
+KNIGHT_FLAG = 1
+
+# Byte: the 4 colors packed in it, lowest bits first
+UNPACKED = [tuple(Board.PALETTE[(byte >> shift) & 3] for shift in range(0, 8, 2)) for byte in range(256)]
+
+
+def pack_colors(colors):
+    """Returns the bytes of the given colors at 2 bits each, padded with the first color to a whole byte"""
+    indices = [Board.PALETTE.index(color) for color in colors]
+    indices += [0] * (-len(indices) % 4)
+    return bytes(first | second << 2 | third << 4 | fourth << 6
+                 for first, second, third, fourth in zip(*[iter(indices)] * 4))
+
+
+def unpack_colors(data, count):
+    """Returns a list of the first count colors packed in the bytes"""
+    return list(chain.from_iterable(UNPACKED[byte] for byte in data))[:count]
+
+
+def encode_board(board, solution=None):
+    """
+    Returns the record of the given board
+    :param board: A Board or a NumpyBoard. A BitBoard or a search state is encoded through its to_board()
+    :param solution: A known solution of the board as a sequence of colors, or None
+    """
+    cells = [board.color_at(row, col) for row in range(board.height) for col in range(board.width)]
+    jokers = sorted(row * board.width + col for row, col in board.joker_locations)
+    solution = list(solution) if solution is not None else []
+    flags = KNIGHT_FLAG if board.mode == Board.KNIGHT else 0
+    header = RECORD_HEADER.pack(board.height, board.width, board.starting_point[0], board.starting_point[1],
+                                flags, len(jokers), len(solution))
+    return header + pack_colors(cells) + struct.pack(f'<{len(jokers)}I', *jokers) + pack_colors(solution)
+
+
+def decode_board(data, offset=0):
+    """
+    Decodes the record at the given offset of the buffer, which may be bytes or an mmap
+    :return: A (board, solution, end) triplet of the Board, its known solution as a list of colors or None,
+    and the offset right after the record
+    """
+    height, width, start_row, start_col, flags, jokers, moves = RECORD_HEADER.unpack_from(data, offset)
+    offset += RECORD_HEADER.size
+    cells_end = offset + (height * width + 3) // 4
+    cells = unpack_colors(data[offset:cells_end], height * width)
+    jokers_end = cells_end + 4 * jokers
+    joker_indices = struct.unpack_from(f'<{jokers}I', data, cells_end)
+    end = jokers_end + (moves + 3) // 4
+
+    board = Board((height, width), (start_row, start_col), copy=True)  # Jokers are set below, not drawn at random
+    board.board = [cells[row * width:(row + 1) * width] for row in range(height)]
+    board.jokers = jokers
+    board.joker_locations = {divmod(index, width) for index in joker_indices}
+    if flags & KNIGHT_FLAG:
+        board.mode = Board.KNIGHT
+    solution = unpack_colors(data[jokers_end:end], moves) if moves else None
+    return board, solution, end
+
+
+class CorpusWriter:
+    """
+    Writes boards to a corpus file one at a time, so a corpus never has to be held in memory.
+    Use as a context manager, the index is written when it exits
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.file.write(CORPUS_HEADER.pack(MAGIC, VERSION, 0, 0))  # Filled in by close()
+        self.offsets = array('Q')
+
+    def add(self, board, solution=None):
+        """Appends the given board and its known solution, if any, to the corpus"""
+        self.offsets.append(self.file.tell())
+        self.file.write(encode_board(board, solution))
+
+    def close(self):
+        index = self.file.tell()
+        for offset in self.offsets:
+            self.file.write(OFFSET.pack(offset))
+        self.file.seek(0)
+        self.file.write(CORPUS_HEADER.pack(MAGIC, VERSION, len(self.offsets), index))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Corpus:
+    """
+    A read-only corpus file mapped into memory. Boards are decoded lazily, one at a time, by index or by iterating.
+    Corpora are cached by path, so every search of a process shares one mapping of the file
+    """
+
+    _cache = {}
+
+    def __init__(self, path):
+        with open(path, 'rb') as corpus_file:
+            self.data = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.size, self.index = CORPUS_HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} board corpus')
+
+    @classmethod
+    def get(cls, path):
+        """Returns the shared corpus of the given file"""
+        if path not in cls._cache:
+            cls._cache[path] = cls(path)
+        return cls._cache[path]
+
+    def record(self, index):
+        """Returns the (board, solution) pair of the board at the given index"""
+        if not 0 <= index < self.size:
+            raise IndexError('corpus index out of range')
+        offset = OFFSET.unpack_from(self.data, self.index + index * OFFSET.size)[0]
+        board, solution, end = decode_board(self.data, offset)
+        return board, solution
+
+    def records(self):
+        """Yields the (board, solution) pair of every board, in order"""
+        offset = CORPUS_HEADER.size
+        for _ in range(self.size):
+            board, solution, offset = decode_board(self.data, offset)
+            yield board, solution
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return self.record(index)[0]
+
+    def __iter__(self):
+        return (board for board, solution in self.records())
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+    from batch_solve import make_board
+
+    parser = argparse.ArgumentParser('Write the boards of a range of seeds to a corpus file')
+    parser.add_argument('--seeds', nargs=2, dest='seeds', type=int, required=True, help='first seed and end of the range')
+    parser.add_argument('-s', '--size', nargs=2, dest='size', type=int, default=(18, 18))
+    parser.add_argument('-p', '--starting_point', nargs=2, dest='start_point', type=int, default=(0, 0))
+    parser.add_argument('-j', '--num_jokers', dest='jokers', type=int, default=0)
+    parser.add_argument('-k', '--knight', dest='knight', action='store_true')
+    parser.add_argument('--solutions', dest='solutions', type=str, default=None,
+                        help='JSONL records of batch_solve.py, whose moves are stored with the boards of their seeds')
+    parser.add_argument('-o', '--output', dest='output', type=str, required=True)
+    args = parser.parse_args()
+
+    known = {}
+    if args.solutions:
+        with open(args.solutions) as solutions_file:
+            for line in solutions_file:
+                record = json.loads(line)
+                if record.get('moves') and 'seed' in record:
+                    known[record['seed']] = record['moves']
+
+    with CorpusWriter(args.output) as writer:
+        for seed in range(*args.seeds):
+            writer.add(make_board(seed, args.size, args.start_point, args.jokers, args.knight), known.get(seed))
@@ -1,4 +1,7 @@
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+from itertools import count
 import heapq
 
 
@@ -19,17 +22,27 @@ class DataStruct(ABC):
 
     def is_empty(self):
         """Returns True iff the data structure is free of any item"""
-        return len(self.list) == 0
+        return len(self) == 0
+
+    def __len__(self):
+        return len(self.list)
 
 
 class Queue(DataStruct):
     """
     Implements a simple Queue data structure.
-    A queue uses the First-in-First-out paradigm
+    A queue uses the First-in-First-out paradigm. Items are kept in a deque, so both ends are O(1)
     """
 
+    def __init__(self):
+        super().__init__()
+        self.list = deque()
+
     def push(self, item, priority=None):
-        self.list.insert(0, item)
+        self.list.append(item)
+
+    def pop(self):
+        return self.list.popleft()
 
 
 class Stack(DataStruct):
@@ -47,13 +60,136 @@ class PriorityQueue(DataStruct):
     Implements a priority queue data structure.
     The queue will store each item with a paired priority. That way,
     when the pop() method is called, the queue will return the item with
-    the lowest priority
+    the lowest priority. Items of the same priority come out last-in-first-out,
+    so the items themselves are never compared
     """
 
+    def __init__(self):
+        super().__init__()
+        self.counter = count()
+
     def push(self, item, priority=None):
-        pair = (priority, item)
-        heapq.heappush(self.list, pair)
+        entry = (priority, -next(self.counter), item)
+        heapq.heappush(self.list, entry)
 
     def pop(self):
-        priority, item = heapq.heappop(self.list)
+        priority, tie, item = heapq.heappop(self.list)
         return item
+
+
+class BucketQueue(DataStruct):
+    """
+    Implements a priority queue for small integer priorities, such as the f-values of A* over unit-cost moves.
+    Items are kept in one bucket per priority, and a pointer to the lowest non-empty bucket only moves up
+    between pushes, so push and pop are O(1) instead of the O(log n) of a heap.
+    Ties are broken in one of two ways:
+        (1) LIFO - the last item pushed with the priority comes out first
+        (2) HIGHER_COST - the item with the highest cost_of(item) comes out first, LIFO among those,
+            which for A* means the node closest to the goal by its heuristic
+    """
+
+    LIFO = 'lifo'
+    HIGHER_COST = 'higher_cost'
+
+    def __init__(self, tie_breaking=LIFO, cost_of=None):
+        super().__init__()
+        if tie_breaking == BucketQueue.HIGHER_COST and cost_of is None:
+            raise ValueError('Breaking ties by the higher cost requires the cost_of function')
+        self.tie_breaking = tie_breaking
+        self.cost_of = cost_of
+        self.buckets = {}  # Key=Priority, Value=List of items, or dict from cost to a list of items for HIGHER_COST
+        self.lowest = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def push(self, item, priority=None):
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = [] if self.tie_breaking == BucketQueue.LIFO else {}
+        if self.tie_breaking == BucketQueue.LIFO:
+            bucket.append(item)
+        else:
+            bucket.setdefault(self.cost_of(item), []).append(item)
+        if self.lowest is None or priority < self.lowest:
+            self.lowest = priority
+        self.size += 1
+
+    def pop(self):
+        if self.size == 0:
+            raise IndexError('pop from an empty BucketQueue')
+        while not self.buckets.get(self.lowest):
+            self.buckets.pop(self.lowest, None)
+            self.lowest += 1
+        bucket = self.buckets[self.lowest]
+        self.size -= 1
+        if self.tie_breaking == BucketQueue.LIFO:
+            return bucket.pop()
+        cost = max(bucket)
+        items = bucket[cost]
+        item = items.pop()
+        if not items:
+            del bucket[cost]
+        return item
+
+
+class TranspositionTable:
+    """
+    A hash table of search states that never grows past the given number of bytes.
+    Each slot holds the 64-bit hash of a state, the cost it was reached with and the iteration it was
+    stored in, in flat arrays, so the table takes ENTRY_BYTES per slot and no Python object per state.
+    The table starts with INITIAL_SLOTS slots and doubles whenever more than half of them hold entries of the
+    current iteration, until it reaches the byte limit, so a small search never allocates the whole limit.
+    When two states map to the same slot, the new one replaces the old one if the old one is from an
+    earlier iteration or was reached at a cost no lower, so the entries closest to the start, which
+    prune the largest subtrees, are kept. States are told apart by their 64-bit hash alone, so a search that
+    prunes by the table is exact only up to hash collisions.
+    """
+
+    ENTRY_BYTES = 8 + 8 + 4  # Hash, cost and iteration
+    INITIAL_SLOTS = 1 << 12
+
+    def __init__(self, max_bytes):
+        self.max_size = max(1, max_bytes // TranspositionTable.ENTRY_BYTES)
+        self.iteration = 0  # The iteration the filled count is of
+        self.filled = 0  # The number of slots holding an entry of the current iteration
+        self.__allocate(min(self.max_size, TranspositionTable.INITIAL_SLOTS))
+
+    def __allocate(self, size):
+        self.size = size
+        self.keys = array('Q', [0]) * size
+        self.costs = array('d', [0]) * size
+        self.iterations = array('I', [0]) * size  # Iterations start at 1, so 0 marks an empty slot
+
+    def __grow(self):
+        """Doubles the number of slots, up to the byte limit, and stores the entries of the current iteration again"""
+        keys, costs, iterations = self.keys, self.costs, self.iterations
+        self.__allocate(min(self.max_size, 2 * self.size))
+        self.filled = 0
+        for key, cost, iteration in zip(keys, costs, iterations):
+            if iteration == self.iteration:
+                self.store(key, cost, iteration)
+
+    def lookup(self, key, iteration):
+        """Returns the cost the state with the given hash was stored with during the iteration, or None"""
+        slot = key % self.size
+        if self.iterations[slot] == iteration and self.keys[slot] == key:
+            return self.costs[slot]
+        return None
+
+    def store(self, key, cost, iteration):
+        """Stores the cost the state with the given hash was reached with, unless its slot holds a more useful entry"""
+        if iteration != self.iteration:  # Entries of earlier iterations are free slots
+            self.iteration = iteration
+            self.filled = 0
+        slot = key % self.size
+        if self.iterations[slot] != iteration:
+            self.filled += 1
+        elif self.keys[slot] != key and self.costs[slot] < cost:
+            return
+        self.keys[slot] = key
+        self.costs[slot] = cost
+        self.iterations[slot] = iteration
+        if 2 * self.filled > self.size and self.size < self.max_size:
+            self.__grow()
@@ -0,0 +1,80 @@
+"""
+Recursion-free flood fill engine for list-of-lists boards.
+Both fills keep their pending cells on an explicit work list, so the size of the filled
+area is only bounded by memory and not by Python's recursion limit.
+"""
+from geometry import Geometry
+
+
+def work_list_fill(board, seeds, color, exclude=frozenset(), knight=False):
+    """
+    Fills from the seeds using the precomputed neighbor tables of the board's shape
+    :param board: A Board object
+    :param seeds: An iterable of (row, col) cells of the given color to start from
+    :param color: The color the fill may pass through
+    :param exclude: A set of cells the fill may not enter
+    :param knight: If True, cells are connected by knight moves; otherwise by adjacency
+    :return: A set of all of the cells reachable from the seeds
+    """
+    grid, width = board.board, board.width
+    neighbor_table = Geometry.get(board.height, width, knight).neighbor_cells
+    filled = set(seeds)
+    stack = list(filled)
+    while stack:
+        row, col = stack.pop()
+        for neighbor in neighbor_table[row * width + col]:
+            if neighbor not in filled and neighbor not in exclude and grid[neighbor[0]][neighbor[1]] == color:
+                filled.add(neighbor)
+                stack.append(neighbor)
+    return filled
+
+
+def span_fill(board, seeds, color, exclude=frozenset()):
+    """
+    Scanline fill for the adjacent (4-neighbor) case. Each work list entry is grown into the
+    longest horizontal run of the color, and only the first cell of every run above and below
+    it is pushed, so the work list holds runs instead of single cells.
+    Takes the same parameters as work_list_fill.
+    """
+    grid = board.board
+    height, width = board.height, board.width
+    filled = set()
+    stack = list(seeds)
+
+    def fillable(row, col):
+        return grid[row][col] == color and (row, col) not in filled and (row, col) not in exclude
+
+    while stack:
+        row, col = stack.pop()
+        if (row, col) in filled:
+            continue
+        left = col
+        while left > 0 and fillable(row, left - 1):
+            left -= 1
+        right = col
+        while right < width - 1 and fillable(row, right + 1):
+            right += 1
+        filled.update((row, run_col) for run_col in range(left, right + 1))
+
+        for next_row in (row - 1, row + 1):
+            if 0 <= next_row < height:
+                in_run = False
+                for run_col in range(left, right + 1):
+                    if fillable(next_row, run_col):
+                        if not in_run:  # Only the first cell of each run needs to be pushed
+                            stack.append((next_row, run_col))
+                            in_run = True
+                    else:
+                        in_run = False
+    return filled
+
+
+def flood_fill(board, seeds, color, exclude=frozenset(), knight=False, span=True):
+    """
+    Fills from the seeds through the given color. Uses the span fill when the
+    neighborhood is adjacency and span is True, and the work list fill otherwise.
+    Takes the same parameters as work_list_fill.
+    """
+    if span and not knight:
+        return span_fill(board, seeds, color, exclude)
+    return work_list_fill(board, seeds, color, exclude, knight)
@@ -1,7 +1,11 @@
 from board import Board
-from random import shuffle
+from threading import Event, Lock, Thread
 from search_problems import FillProblem
-from search_algorithms import run_search_algorithm
+from search_algorithms import anytime_search, run_search_algorithm
+from heuristics import HEURISTIC_ALIASES, HEURISTICS, weighted_sum_heuristic
+from search_stats import SearchStats
+from solution_cache import SolutionCache
+from pattern_database import PatternDatabase
 import pygame as pg
 
 
@@ -10,14 +14,22 @@ class Game:
     GAME_OVER_LOSS_MSG = 'Game Over! You Lost!'
     GAME_OVER_WIN_MSG = 'Game Over! You Won!'
     INVALID_INPUT_MSG = 'Invalid input. Please enter one of the following colors: '
+    NO_SOLUTION_MSG = 'No solution found within the time limit'
     KNIGHT_HOTKEY = Board.KNIGHT
     HINT_HOTKEY = 'H'
     HOTKEYS = [KNIGHT_HOTKEY, HINT_HOTKEY]
+    HINT_TIME_LIMIT = 0.1  # Seconds a hint may take
+    REPLAN_TIME_LIMIT = 2  # Seconds the background search improves a plan for after the player deviates from it
 
-    def __init__(self, size=(18, 18), starting_point=(0, 0), move_allowance=21, num_jokers=0):
+    def __init__(self, size=(18, 18), starting_point=(0, 0), move_allowance=21, num_jokers=0, solutions=None):
         self.board = Board(size, starting_point, num_jokers)
+        self.solutions = solutions  # A SolutionCache of the positions solved before, or None
         self.move_num = 0
         self.move_allowance = int(move_allowance)
+        self.plan = None  # A (position key, moves) pair of the plan the hints come from
+        self.plan_lock = Lock()
+        self.plan_generation = 0  # Bumped on every re-plan, so an outdated background search stops publishing
+        self.replan = None  # A (thread, stop event) pair of the background search improving the plan, or None
 
     def one_turn(self):
         """
@@ -28,8 +40,8 @@ class Game:
         """
         user_input = self.get_input()
         if user_input.upper() in Board.COLORS:  # If the user wants to color the board
-            self.board.apply_color_move(user_input.upper())
-            self.move_num += 1
+            for row, col in self.play_move(user_input.upper()):
+                print(Board.JOKER_FOUND_MSG.format(row, col))
             print(self.board)
         elif user_input in Game.HOTKEYS:  # If we have a special input
             if user_input == Game.KNIGHT_HOTKEY:
@@ -40,11 +52,116 @@ class Game:
                 print(f'The AI agent suggests you play: {hint_letter.upper()}')
 
     def get_hint(self):
-        """Returns a single move as a hint to play"""
-        shuffle(self.board.COLORS)
+        """
+        Returns a single move as a hint to play. The hint comes from the cached plan when it was made for the
+        current position, and otherwise from the best plan found within HINT_TIME_LIMIT, which is then cached
+        """
+        key = self.position_key()
+        hint = self.cached_hint(key)
+        if hint is not None:
+            return hint
+        return self.find_hint(FillProblem(self.board), key)
+
+    def cached_hint(self, key):
+        """
+        Returns the next move of the cached plan if it was made for the position of the given key, or else
+        the next move of the position's solution in the solution cache, which becomes the plan. None if neither exists.
+        Must be called with the key of the current position
+        """
+        with self.plan_lock:
+            if self.plan is not None and self.plan[0] == key and self.plan[1]:
+                return self.plan[1][0]
+        moves = self.solutions.lookup(self.board) if self.solutions is not None else None
+        if moves:
+            with self.plan_lock:
+                self.plan_generation += 1
+                self.plan = key, moves
+            return moves[0]
+        return None
+
+    def find_hint(self, problem, key):
+        """
+        Searches for a plan from the start state of the problem, caches it under the given position key and
+        returns its first move. Only reads the problem, so it may run outside of the thread that plays the moves
+        """
+        moves = None
+        for moves in anytime_search(problem, time_limit=Game.HINT_TIME_LIMIT):
+            pass
+        if moves:
+            with self.plan_lock:
+                self.plan_generation += 1
+                self.plan = key, moves
+            if self.solutions is not None:
+                self.solutions.store(problem.get_start_state(), moves)
+            return moves[0]
+        # No plan was found in time, so suggest the move that looks best one move ahead
+        state = problem.get_start_state()
+        return min(state.moves(), key=lambda move: weighted_sum_heuristic(state.successor(move)))
+
+    def position_key(self):
+        """Returns a key of everything a plan depends on: the board's Zobrist hash, which covers its jokers, and mode"""
+        return hash(self.board), self.board.mode
+
+    def play_move(self, color):
+        """
+        Applies the given color to the board and keeps the cached plan in step with it.
+        If the move is the one the plan suggested, the rest of the plan is kept for the next hint.
+        Otherwise, the moves of the old plan that still absorb cells are kept, and a background search
+        tries to improve on them for REPLAN_TIME_LIMIT seconds. The background search of an earlier move is stopped
+        first, so at most one runs at a time
+        :param color: A color in the form of a single char
+        :return: A sorted list of the (row, col) cells of the jokers the move triggered, for the caller to report
+        """
+        key = self.position_key()
+        triggered = self.board.apply_color_move(color)
+        self.move_num += 1
+        with self.plan_lock:
+            plan, self.plan = self.plan, None
+            self.plan_generation += 1
+            generation = self.plan_generation
+        self.__stop_replan()
+        if plan is None or plan[0] != key or self.board.full_board():  # Only a plan for the last position is kept
+            return triggered
+        if plan[1] and plan[1][0] == color:
+            with self.plan_lock:
+                self.plan = self.position_key(), plan[1][1:]
+            return triggered
+
         problem = FillProblem(self.board)
-        moves = run_search_algorithm('dfs', problem)
-        return moves[0]
+        state = problem.get_start_state()
+        repaired = []
+        for move in plan[1]:
+            if state.full_board():
+                break
+            if move in state.moves():  # Moves that no longer absorb anything are dropped
+                repaired.append(move)
+                state = state.successor(move)
+        repaired = repaired if state.full_board() else None
+        key = self.position_key()
+        if repaired:
+            with self.plan_lock:
+                self.plan = key, repaired
+        stop = Event()
+        thread = Thread(target=self.__improve_plan, args=(problem, key, repaired, generation, stop), daemon=True)
+        self.replan = thread, stop
+        thread.start()
+        return triggered
+
+    def __stop_replan(self):
+        """Stops the background search of the plan, if one is running, and waits for it to return"""
+        if self.replan is not None:
+            thread, stop = self.replan
+            stop.set()
+            thread.join()
+            self.replan = None
+
+    def __improve_plan(self, problem, key, plan, generation, stop):
+        """Runs the anytime search in the background and caches every better plan it finds, until it is outdated"""
+        for moves in anytime_search(problem, time_limit=Game.REPLAN_TIME_LIMIT, initial=plan, stop=stop):
+            with self.plan_lock:
+                if generation != self.plan_generation:
+                    return
+                self.plan = key, moves
 
     @staticmethod
     def __invalid_input_msg():
@@ -87,91 +204,151 @@ class Game:
         """Returns True iff the board is colored entirely in the same color or all moves have been used"""
         return self.move_num == self.move_allowance or self.board.full_board()
 
-    def run_search_agent_game(self, agent_name, heuristic_name):
+    def run_search_agent_game(self, agent_name, heuristic_name, compress=False, workers=None, time_limit=None,
+                              table_bytes=None, stats_path=None):
         """
         Runs an AI search agent to obtain a sequence of actions and then applies them to the board
         :param agent_name: A string with the name of the search algorithm
         :param heuristic_name: A string with the name of the heuristic to use
+        :param compress: If True, the search runs on the board's graph of same-color regions
+        :param workers: The number of worker processes of the parallel A* search
+        :param time_limit: Seconds the anytime search runs for
+        :param table_bytes: Bytes of the transposition table of the IDA* search
+        :param stats_path: A file to write the search statistics to as JSON, or None to not record them
+        If no solution is found, the board is left as it is
         """
         from time import time
         start = time()
-        problem = FillProblem(self.board)
-        moves = run_search_algorithm(agent_name, problem, heuristic_name == 'null')
+        problem = FillProblem(self.board, compress)
+        stats = SearchStats(histograms=True) if stats_path else None
+        moves = run_search_algorithm(agent_name, problem, heuristic_name, workers, time_limit, table_bytes, stats,
+                                     self.solutions)
+        if stats is not None:
+            stats.to_json(stats_path)
+        if not isinstance(moves, list):  # The anytime search ran out of time before it found a solution
+            print(Game.NO_SOLUTION_MSG)
+            return
         for move in moves:
             self.board.apply_color_move(move)
             self.move_num += 1
         print(f'Moves taken: {moves}')
         print(f'Number of nodes expanded: {problem.expanded}')
+        if hasattr(problem, 'expanded_per_worker'):
+            print(f'Number of nodes expanded per worker: {problem.expanded_per_worker}')
         print(f'Number of moves required: {len(moves)}')
         print(f'Solution found in {time() - start} seconds')
 
 
 class GUI:
+    """
+    The pygame front end. The event loop never runs a search itself: hints and the auto-solver run in a
+    background thread that posts its result back as a SEARCH_DONE_EVENT, so the window keeps responding.
+    Each frame only repaints the cells whose color changed since the last frame, and updates the display
+    for their rects alone.
+    """
 
     INVALID_INPUT = None
     TITLE_MESSAGE = 'Color Fill Game'
+    HINT_HOTKEY = 'hint'
+    SOLVE_HOTKEY = 'solve'
 
     # Color fill numbers for RGB fill
     RED_FILL = (255, 0, 0)
     BLUE_FILL = (0, 0, 255)
     GREEN_FILL = (0, 255, 0)
     YELLOW_FILL = (255, 255, 0)
+    FILLS = {Board.RED: RED_FILL, Board.BLUE: BLUE_FILL, Board.GREEN: GREEN_FILL, Board.YELLOW: YELLOW_FILL}
+    BACKGROUND = (255, 255, 255)
+    TEXT_COLOR = (0, 0, 0)
+
+    SEARCH_DONE_EVENT = pg.USEREVENT + 1  # Posted by the search thread, with the kind, key and moves of its result
+    PLAY_EVENT = pg.USEREVENT + 2  # Posted by a timer to play the next move of the auto-solver
+    PLAY_DELAY = 250  # Milliseconds between the moves of the auto-solver
 
-    def __init__(self, game: Game):
+    def __init__(self, game: Game, search='anytime', heuristic='weighted', time_limit=None):
         self.game = game
         self.width = self.game.board.width
         self.height = self.game.board.height
         self.square_size = 30
         self.padding = 150
         self.playing = True
+        self.search = search  # The search algorithm and heuristic of the auto-solver
+        self.heuristic = heuristic
+        self.time_limit = time_limit
+        self.searching = None  # The kind of search running in the background, if any
+        self.hint = None  # The last hint, shown until the next move
+        self.solution = []  # The moves the auto-solver has yet to play
 
         pg.init()
         self.window = pg.display.set_mode((self.square_size * self.width + self.padding, self.square_size * self.height))
         self.clock = pg.time.Clock()
         pg.display.set_caption(GUI.TITLE_MESSAGE)
+        self.font = pg.font.SysFont('comicsans', 28)
+        self.title_font = pg.font.SysFont('comicsans', 150, True)
+        self.drawn = None  # The colors of the cells as they were last drawn, or None before the first frame
+        self.panel = None  # The lines of the side panel as they were last drawn
 
-    def get_color(self, row, col):
-        """Given the (row, col) pair, will return the RGB color fills according to the state of the board"""
-        square = self.game.board.board[row][col]
-        if square == self.game.board.BLUE:
-            return GUI.BLUE_FILL
-        elif square == self.game.board.GREEN:
-            return GUI.GREEN_FILL
-        elif square == self.game.board.RED:
-            return GUI.RED_FILL
-        elif square == self.game.board.YELLOW:
-            return GUI.YELLOW_FILL
+    def draw_cells(self):
+        """
+        Repaints every run of cells in a row whose color changed since the last frame
+        :return: A list of the rects that were repainted
+        """
+        size = self.square_size
+        dirty = []
+        for row, colors in enumerate(self.game.board.board):
+            drawn = self.drawn[row]
+            if colors == drawn:
+                continue
+            col = 0
+            while col < self.width:
+                if colors[col] == drawn[col]:
+                    col += 1
+                    continue
+                start, color = col, colors[col]
+                while col < self.width and colors[col] == color and colors[col] != drawn[col]:
+                    col += 1
+                rect = pg.Rect(start * size, row * size, (col - start) * size, size)
+                self.window.fill(GUI.FILLS[color], rect)
+                dirty.append(rect)
+            self.drawn[row] = list(colors)
+        return dirty
+
+    def draw_panel(self):
+        """
+        Redraws the side panel if any of its lines changed since the last frame
+        :return: A list with the rect of the panel, or an empty list if it was not redrawn
+        """
+        lines = ['Moves Made:', f'{self.game.move_num} / {self.game.move_allowance}',
+                 'Moves Left:', f'{self.game.move_allowance - self.game.move_num}']
+        if self.searching is not None:
+            lines.append('Thinking...')
+        elif self.hint is not None:
+            lines.append(f'Hint: {self.hint}')
+        if lines == self.panel:
+            return []
+        self.panel = lines
+        rect = pg.Rect(self.width * self.square_size, 0, self.padding, self.height * self.square_size)
+        self.window.fill(GUI.BACKGROUND, rect)
+        for line, top in zip(lines, [10, 30, 70, 90, 130]):
+            self.window.blit(self.font.render(line, 1, GUI.TEXT_COLOR), (rect.left + 5, top))
+        return [rect]
 
     def draw(self, game_over=False, won=False):
-        """Draws the board on the window"""
-        self.window.fill((255, 255, 255))
-
-        for row in range(self.height):
-            for col in range(self.width):
-                color = self.get_color(row, col)
-                pg.draw.rect(self.window, color, (col * self.square_size, row * self.square_size, self.square_size, self.square_size))
-
-        font = pg.font.SysFont('comicsans', 28)
-
-        moves_made_header = font.render('Moves Made:', 1, (0, 0, 0))
-        self.window.blit(moves_made_header, (self.width * self.square_size + 5, 10))
-        moves_made_text = font.render(f'{self.game.move_num} / {self.game.move_allowance}', 1, (0, 0, 0))
-        self.window.blit(moves_made_text, (self.width * self.square_size + 5, 30))
-
-        moves_remaining_header = font.render('Moves Left:', 1, (0, 0, 0))
-        self.window.blit(moves_remaining_header, (self.width * self.square_size + 5, 70))
-        moves_remaining_text = font.render(f'{self.game.move_allowance - self.game.move_num}', 1, (0, 0, 0))
-        self.window.blit(moves_remaining_text, (self.width * self.square_size + 5, 90))
-
+        """Draws the board on the window, updating the display only where the board or the panel changed"""
+        if self.drawn is None:  # The first frame paints everything
+            self.window.fill(GUI.BACKGROUND)
+            self.drawn = [[None] * self.width for _ in range(self.height)]
+            self.draw_cells()
+            self.draw_panel()
+            pg.display.update()
+            return
+
+        dirty = self.draw_cells() + self.draw_panel()
         if game_over:
-            font = pg.font.SysFont('comicsans', 150, True)
-            if won:
-                text = font.render('You Won!', 1, (0, 0, 0))
-            else:
-                text = font.render('You Lost!', 1, (0, 0, 0))
-            self.window.blit(text, (75, 100))
-
-        pg.display.update()
+            text = self.title_font.render('You Won!' if won else 'You Lost!', 1, GUI.TEXT_COLOR)
+            dirty.append(self.window.blit(text, (75, 100)))
+        if dirty:
+            pg.display.update(dirty)
 
     def get_user_input(self, event):
         """Receives a KEYDOWN event. If the input is valid, return the relevant character; else, return GUI.INVALID_INPUT"""
@@ -185,9 +362,55 @@ class GUI:
             return self.game.board.GREEN
         elif event.key == pg.K_k:
             return self.game.board.KNIGHT
+        elif event.key == pg.K_h:
+            return GUI.HINT_HOTKEY
+        elif event.key == pg.K_s:
+            return GUI.SOLVE_HOTKEY
         else:
             return GUI.INVALID_INPUT
 
+    def start_search(self, kind):
+        """
+        Starts a hint or auto-solver search in a background thread, unless one is already running.
+        The problem is built here, from the board as it is now, so the thread never reads the board
+        while a move changes it.
+        """
+        if self.searching is not None:
+            return
+        key = self.game.position_key()
+        if kind == GUI.HINT_HOTKEY:
+            hint = self.game.cached_hint(key)
+            if hint is not None:
+                self.hint = hint
+                return
+        self.searching = kind
+        Thread(target=self.__search, args=(kind, FillProblem(self.game.board), key), daemon=True).start()
+
+    def __search(self, kind, problem, key):
+        """Runs in the background thread, and posts the moves it found to the event loop"""
+        if kind == GUI.HINT_HOTKEY:
+            moves = [self.game.find_hint(problem, key)]
+        else:
+            moves = run_search_algorithm(self.search, problem, self.heuristic, time_limit=self.time_limit,
+                                         cache=self.game.solutions)
+            moves = moves if isinstance(moves, list) else []
+        pg.event.post(pg.event.Event(GUI.SEARCH_DONE_EVENT, kind=kind, key=key, moves=moves))
+
+    def search_done(self, event):
+        """Handles the result of a background search. Results for a position that was since left are dropped"""
+        self.searching = None
+        if event.key != self.game.position_key() or not event.moves:
+            return
+        if event.kind == GUI.HINT_HOTKEY:
+            self.hint = event.moves[0]
+        else:
+            self.solution = list(event.moves)
+            pg.time.set_timer(GUI.PLAY_EVENT, GUI.PLAY_DELAY)
+
+    def play(self, color):
+        self.hint = None
+        self.game.play_move(color)
+
     def run_game_loop(self):
         """Manages the logic for one game"""
         pg.event.clear()
@@ -197,14 +420,25 @@ class GUI:
             if event.type == pg.QUIT:  # Check to see if the user hit the 'Exit' button
                 self.playing = False
 
-            elif event.type == pg.KEYDOWN:
+            elif event.type == pg.KEYDOWN and not self.solution:  # The keys are ignored while the solver plays
                 user_input = self.get_user_input(event)
                 if user_input is not GUI.INVALID_INPUT:  # If the user inputted a valid input
                     if user_input == self.game.KNIGHT_HOTKEY:
                         self.game.board.toggle_mode(print_message=False)
+                        self.hint = None
+                    elif user_input in (GUI.HINT_HOTKEY, GUI.SOLVE_HOTKEY):
+                        self.start_search(user_input)
                     else:
-                        self.game.board.apply_color_move(user_input)
-                        self.game.move_num += 1
+                        self.play(user_input)
+
+            elif event.type == GUI.SEARCH_DONE_EVENT:
+                self.search_done(event)
+
+            elif event.type == GUI.PLAY_EVENT:
+                if self.solution:
+                    self.play(self.solution.pop(0))
+                if not self.solution:
+                    pg.time.set_timer(GUI.PLAY_EVENT, 0)
 
             if self.game.game_over():
                 self.playing = False
@@ -226,15 +460,30 @@ if __name__ == "__main__":
     parser.add_argument('-j', '--num_jokers', dest='jokers', type=int, default=0)
     parser.add_argument('-g', '--gui', dest='gui', type=bool, default=True)
     parser.add_argument('--search_method', dest='search', type=str, default=None)
-    parser.add_argument('--heuristic', dest='heuristic', type=str, default='true')
+    parser.add_argument('--heuristic', dest='heuristic', type=str, default='weighted',
+                        choices=list(HEURISTICS) + list(HEURISTIC_ALIASES))
+    parser.add_argument('--compress', dest='compress', action='store_true')
+    parser.add_argument('--workers', dest='workers', type=int, default=None)
+    parser.add_argument('--time_limit', dest='time_limit', type=float, default=None)
+    parser.add_argument('--table_bytes', dest='table_bytes', type=int, default=None)
+    parser.add_argument('--stats', dest='stats', type=str, default=None)
+    parser.add_argument('--cache', dest='cache', type=str, default=None)
+    parser.add_argument('--pattern_db', dest='pattern_db', type=str, default=None)
     args = parser.parse_args()
 
-    game = Game(args.size, args.start_point, args.move_allow, args.jokers)
+    if args.compress and args.jokers > 0:
+        parser.error('--compress cannot be used with jokers, which recolor cells across region boundaries')
+    if args.pattern_db:
+        PatternDatabase.load(args.pattern_db)
+
+    game = Game(args.size, args.start_point, args.move_allow, args.jokers,
+                SolutionCache.get(args.cache) if args.cache else None)
 
     if args.gui:
-        gui = GUI(game)
+        gui = GUI(game, args.search or 'anytime', args.heuristic, args.time_limit)
         gui.run_game_loop()
     elif args.search:  # If we want to run this game with an AI agent and not allow a user input
-        game.run_search_agent_game(args.search, args.heuristic)
+        game.run_search_agent_game(args.search, args.heuristic, args.compress, args.workers, args.time_limit,
+                                   args.table_bytes, args.stats)
     else:  # Regular game using user input
         game.run_user_game()
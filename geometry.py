@@ -0,0 +1,97 @@
+ADJACENT_OFFSETS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+KNIGHT_OFFSETS = ((-1, -2), (-1, 2), (-2, -1), (-2, 1), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+class Geometry:
+    """
+    Precomputed neighbor tables of a board of a given (height, width) in either neighborhood.
+    Cell (row, col) has the flat index (row * width + col), and neighbors[index] is a tuple of the flat
+    indices of its neighbors inside the board, in the order of the offsets. neighbor_cells holds the same
+    tables as (row, col) pairs for the list-of-lists boards, and adjacent / adjacent_cells always hold the
+    immediately adjacent neighbors, which jokers color in either mode.
+    Each table is built the first time it is used, since a large board only ever needs some of them.
+    Geometries are immutable and cached, so every board of the same shape and mode, and every copy of it, shares one.
+    """
+
+    ADJACENT_OFFSETS = ADJACENT_OFFSETS
+    KNIGHT_OFFSETS = KNIGHT_OFFSETS
+
+    _cache = {}
+
+    def __init__(self, height, width, knight):
+        self.height = height
+        self.width = width
+        self.knight = knight
+        self.size = height * width
+        self.offsets = Geometry.KNIGHT_OFFSETS if knight else Geometry.ADJACENT_OFFSETS
+        self.__indices = None
+        self.__cells = None
+        self.__tables = {}
+
+    @classmethod
+    def get(cls, height, width, knight):
+        """Returns the shared geometry for the given shape and neighborhood"""
+        key = (height, width, knight)
+        if key not in cls._cache:
+            cls._cache[key] = cls(height, width, knight)
+        return cls._cache[key]
+
+    def __reduce__(self):  # Pickled as its key, so the tables are neither copied nor duplicated in another process
+        return Geometry.get, (self.height, self.width, self.knight)
+
+    @property
+    def indices(self):
+        """The flat index of every cell. Every index table refers to these int objects instead of new ones"""
+        if self.__indices is None:
+            self.__indices = list(range(self.size))
+        return self.__indices
+
+    @property
+    def cells(self):
+        """The (row, col) pair of every flat index"""
+        if self.__cells is None:
+            cols = list(range(self.width))
+            self.__cells = [(row, col) for row in range(self.height) for col in cols]
+        return self.__cells
+
+    @property
+    def neighbors(self):
+        return self.__table('neighbors', self.offsets, self.indices)
+
+    @property
+    def neighbor_cells(self):
+        return self.__table('neighbor_cells', self.offsets, self.cells)
+
+    @property
+    def adjacent(self):
+        if not self.knight:
+            return self.neighbors
+        return self.__table('adjacent', Geometry.ADJACENT_OFFSETS, self.indices)
+
+    @property
+    def adjacent_cells(self):
+        if not self.knight:
+            return self.neighbor_cells
+        return self.__table('adjacent_cells', Geometry.ADJACENT_OFFSETS, self.cells)
+
+    def __table(self, name, offsets, values):
+        """
+        Returns the table of the given name, which holds the values of the neighbors of every cell under the offsets.
+        Each table is built once per geometry, so the bounds of every neighbor are simply checked.
+        """
+        table = self.__tables.get(name)
+        if table is not None:
+            return table
+
+        height, width = self.height, self.width
+        table = []
+        for row in range(height):
+            for col in range(width):
+                cell_neighbors = []
+                for d_row, d_col in offsets:
+                    neigh_row, neigh_col = row + d_row, col + d_col
+                    if 0 <= neigh_row < height and 0 <= neigh_col < width:
+                        cell_neighbors.append(values[neigh_row * width + neigh_col])
+                table.append(tuple(cell_neighbors))
+        table = self.__tables[name] = tuple(table)
+        return table
@@ -1,4 +1,138 @@
 from math import sqrt
+from pattern_database import PatternDatabase
+
+
+class ConqueredStats:
+    """
+    Running counters of the 'conquered' area that the Heuristics class is built from.
+    The counters are immutable, and absorb() returns new counters updated only for the newly
+    conquered cells, so boards and search states can carry them from move to move.
+    """
+
+    __slots__ = ('height', 'width', 'size', 'vertical', 'horizontal', 'border', 'corners', 'corner_distance')
+
+    def __init__(self, height, width, size=0, vertical=0, horizontal=0, border=0, corners=0, corner_distance=None):
+        self.height = height
+        self.width = width
+        self.size = size  # Number of conquered cells
+        self.vertical = vertical  # Perimeter edges between horizontally adjacent cells and on the left edge
+        self.horizontal = horizontal  # Perimeter edges between vertically adjacent cells and on the top edge
+        self.border = border  # Number of conquered cells on the border of the board
+        self.corners = corners  # Number of conquered corners
+        self.corner_distance = corner_distance  # Shortest euclidean distance to the bottom right corner
+
+    @classmethod
+    def of_cells(cls, height, width, cells):
+        """Returns the counters of the given set of conquered cells, computed from scratch"""
+        return cls(height, width).absorb(cells, lambda row, col: False)
+
+    @classmethod
+    def of_mask(cls, height, width, mask):
+        """
+        Returns the counters of the conquered cells set in the given BitBoard mask, bit (row * width + col).
+        Every counter is a handful of whole-mask operations, so the cost does not grow with the number of cells.
+        """
+        masks = StatsMasks.get(height, width)
+        size = bin(mask).count('1')
+        # A perimeter edge lies between a conquered and an unconquered cell, so it is a set bit of the mask
+        # XOR-ed with the mask shifted by one cell to the right or down, plus the conquered cells on the left/top edge
+        vertical = bin(mask & masks.first_col).count('1') + bin((mask ^ (mask >> 1)) & masks.not_last_col).count('1')
+        horizontal = bin(mask & masks.first_row).count('1') + \
+            bin((mask ^ (mask >> width)) & masks.not_last_row).count('1')
+        border = bin(mask & masks.border).count('1')
+        corners = sum(1 for corner in masks.corners if mask & corner)  # A corner of a one-row board counts twice
+        corner_distance = masks.corner_distance(mask)
+        return cls(height, width, size, vertical, horizontal, border, corners, corner_distance)
+
+    def absorb(self, cells, is_conquered):
+        """
+        Returns the counters after the given cells are added to the conquered area
+        :param cells: An iterable of the newly conquered (row, col) cells
+        :param is_conquered: A function of (row, col) that returns True iff the cell was conquered before the move
+        :return: A new ConqueredStats object
+        """
+        height, width = self.height, self.width
+        size, vertical, horizontal, border, corners = self.size, self.vertical, self.horizontal, self.border, self.corners
+        corner_distance = self.corner_distance
+        corner_list = [(0, 0), (0, width - 1), (height - 1, 0), (height - 1, width - 1)]
+        added = set()
+
+        def inside(row, col):
+            return (row, col) in added or is_conquered(row, col)
+
+        for row, col in cells:
+            size += 1
+            # Each edge shared with a conquered cell stops being perimeter, every other edge becomes perimeter
+            vertical += 1 if col == 0 or not inside(row, col - 1) else -1
+            if col < width - 1:
+                vertical += -1 if inside(row, col + 1) else 1
+            horizontal += 1 if row == 0 or not inside(row - 1, col) else -1
+            if row < height - 1:
+                horizontal += -1 if inside(row + 1, col) else 1
+            if row == 0 or col == 0 or row == height - 1 or col == width - 1:
+                border += 1
+            corners += corner_list.count((row, col))
+            distance = sqrt((row - height + 1) ** 2 + (col - width + 1) ** 2)
+            if corner_distance is None or distance < corner_distance:
+                corner_distance = distance
+            added.add((row, col))
+        return ConqueredStats(height, width, size, vertical, horizontal, border, corners, corner_distance)
+
+
+class StatsMasks:
+    """
+    The BitBoard masks ConqueredStats.of_mask counts cells with, for a board of a given (height, width).
+    The cells are also sorted by their distance to the bottom right corner, and prefix_masks[i] holds the
+    cells of the i+1 smallest distances, so the closest conquered cell is found by a binary search over masks.
+    Cached per shape, like the geometries of the boards.
+    """
+
+    _cache = {}
+
+    def __init__(self, height, width):
+        full = (1 << (height * width)) - 1
+        row_bits = (1 << width) - 1
+        first_col = sum(1 << (row * width) for row in range(height))
+        self.first_col = first_col
+        self.not_last_col = full & ~(first_col << (width - 1))
+        self.first_row = row_bits
+        self.not_last_row = full >> width
+        self.border = first_col | (first_col << (width - 1)) | row_bits | (row_bits << ((height - 1) * width))
+        self.corners = [1 << (row * width + col) for row, col in [(0, 0), (0, width - 1), (height - 1, 0),
+                                                                  (height - 1, width - 1)]]
+
+        by_distance = {}
+        for row in range(height):
+            for col in range(width):
+                distance = sqrt((row - height + 1) ** 2 + (col - width + 1) ** 2)
+                by_distance[distance] = by_distance.get(distance, 0) | (1 << (row * width + col))
+        self.distances = sorted(by_distance)
+        self.prefix_masks = []
+        prefix = 0
+        for distance in self.distances:
+            prefix |= by_distance[distance]
+            self.prefix_masks.append(prefix)
+
+    @classmethod
+    def get(cls, height, width):
+        """Returns the shared masks for the given shape"""
+        key = (height, width)
+        if key not in cls._cache:
+            cls._cache[key] = cls(height, width)
+        return cls._cache[key]
+
+    def corner_distance(self, mask):
+        """Returns the shortest distance from a cell of the mask to the bottom right corner, or None for no cells"""
+        if not mask:
+            return None
+        low, high = 0, len(self.prefix_masks) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if self.prefix_masks[middle] & mask:
+                high = middle
+            else:
+                low = middle + 1
+        return self.distances[low]
 
 
 class Heuristics:
@@ -8,14 +142,17 @@ class Heuristics:
         (2) Number of total cells 'conquered'
         (3) Number of border cells 'conquered'
         (4) Size of the perimeter
-    There is also a method to return a weighted sum of these heuristics
+    There is also a method to return a weighted sum of these heuristics.
+    The heuristics are read off the ConqueredStats the board keeps up to date, so no method scans the board.
     """
 
     def __init__(self, board):
         self.board = board
-        self.all_neighbors = self.board.find_extended_neighbors(self.board.starting_point[0],
-                                                                self.board.starting_point[1],
-                                                                {self.board.starting_point})
+        self.stats = self.board.conquered_stats()
+
+    @property
+    def all_neighbors(self):
+        return self.board.conquered_cells()
 
     def distance_to_corner(self, dist_func=None):
         """
@@ -27,73 +164,30 @@ class Heuristics:
         :return: A float
         """
         if not dist_func:
-            dist_func = lambda x: sqrt(
-                (x[0] - self.board.height + 1) ** 2 +
-                (x[1] - self.board.width + 1) ** 2
-            )
+            return self.stats.corner_distance
         min_point = min(self.all_neighbors, key=dist_func)
         return dist_func(min_point)
 
     def number_uncovered(self):
         """Returns the number of cells not 'conquered' already"""
-        return self.board.width * self.board.height - len(self.all_neighbors)
+        return self.board.width * self.board.height - self.stats.size
 
     def _vertical_perimeter_sum(self):
         """Returns all of the vertical perimeter edges"""
-        total = 0
-        for row in range(self.board.height):
-            in_conquered = False
-            for col in range(self.board.width):
-                if (row, col) in self.all_neighbors:  # If our cell is 'inside' the perimeter
-                    if not in_conquered:  # If the previous cell was 'outside' the perimeter
-                        total += 1  # Add one for a 'left-border'
-                        in_conquered = True  # Indicate that we are now within the perimeter
-                elif in_conquered:  # Our cell is 'outside' the perimeter and the previous cell was 'inside'
-                    total += 1  # Add one for a 'right-border'
-                    in_conquered = False  # Indicate that we have left the perimeter
-        return total
+        return self.stats.vertical
 
     def _horizontal_perimeter_sum(self):
         """Finds all of the horizontal perimeter edges"""
-        total = 0
-        for col in range(self.board.width):
-            in_conquered = False
-            for row in range(self.board.height):
-                if (row, col) in self.all_neighbors:  # If our cell is 'inside' the perimeter
-                    if not in_conquered:  # If the previous cell was 'outside' the perimeter
-                        total += 1  # Add one for a 'left-border'
-                        in_conquered = True  # Indicate that we are now within the perimeter
-                elif in_conquered:  # Our cell is 'outside' the perimeter and the previous cell was 'inside'
-                    total += 1  # Add one for a 'right-border'
-                    in_conquered = False  # Indicate that we have left the perimeter
-        return total
+        return self.stats.horizontal
 
     def number_border_uncovered(self):
         """Returns the number of cells on the border not covered"""
-        total = 0
-        for x, y in self.all_neighbors:  # Check corners individually
-            if (x == 0 and y == 0) or \
-                    (x == 0 and y == self.board.width - 1) or \
-                    (x == self.board.height - 1 and y == 0) or \
-                    (x == self.board.height - 1 and y == self.board.width - 1):
-                total += 1
-            elif x == 0 or y == 0 or x == self.board.height - 1 or y == self.board.width - 1:
-                total += 1
         total_border = 2 * self.board.height + 2 * (self.board.width - 2)
-        return total_border - total
+        return total_border - self.stats.border
 
     def number_corners_covered(self):
         """Returns the number of corners covered"""
-        total = 0
-        if (0, 0) in self.all_neighbors:
-            total += 1
-        if (0, self.board.width - 1) in self.all_neighbors:
-            total += 1
-        if (self.board.height - 1, 0) in self.all_neighbors:
-            total += 1
-        if (self.board.height - 1, self.board.width - 1) in self.all_neighbors:
-            total += 1
-        return total
+        return self.stats.corners
 
     def perimeter(self):
         """Returns the size of the border of the board minus the size of the perimeter around the 'conquered' area"""
@@ -124,6 +218,221 @@ class Heuristics:
         return (perimeter * perimeter_weight + border * border_weight + corner_dist * corner_dist_weight + total_covered * total_covered_weight) / 20
 
 
+
+def null_heuristic(state):
+    """The trivial heuristic, which turns A* into uniform cost search"""
+    return 0
+
+
+def weighted_sum_heuristic(state):
+    """The hand-tuned weighted sum of the Heuristics class. Not admissible"""
+    return Heuristics(state).get_weighted_sum()
+
+
+def colors_remaining_heuristic(state):
+    """
+    Returns the number of colors left among the regions the conquered area can still reach.
+    A move only absorbs cells of a single color, so every remaining color costs at least one move.
+    Admissible, and 0 for positions where jokers can still recolor cells of several colors at once.
+    """
+    view = state.region_view()
+    if view is None:
+        return 0
+    graph, conquered, frontier = view
+    reachable = _reachable_regions(graph, conquered, frontier)[0]
+    return sum(1 for color_mask in graph.color_masks if color_mask & reachable)
+
+
+def eccentricity_heuristic(state):
+    """
+    Returns the eccentricity of the conquered area in the region graph: the BFS distance to the farthest
+    region it can reach. A move only absorbs regions adjacent to the conquered area, so a region at
+    distance d is absorbed d moves from now at the earliest.
+    Admissible, and 0 for positions where jokers can still recolor cells of several colors at once.
+    """
+    view = state.region_view()
+    if view is None:
+        return 0
+    return _reachable_regions(*view)[1]
+
+
+def admissible_heuristic(state):
+    """The maximum of the admissible bounds, which is itself admissible"""
+    view = state.region_view()
+    if view is None:
+        return 0
+    graph, conquered, frontier = view
+    reachable, eccentricity = _reachable_regions(graph, conquered, frontier)
+    colors = sum(1 for color_mask in graph.color_masks if color_mask & reachable)
+    return max(colors, eccentricity)
+
+
+def pattern_database_heuristic(state):
+    """
+    The admissible bounds, raised by the pattern database of the board if one was loaded with
+    PatternDatabase.load(). A pattern whose nearest unconquered region is in the d-th BFS layer around the
+    conquered area keeps its abstract position for the next d - 1 moves at least, after which its table value
+    is a lower bound on the moves left, so d - 1 plus the value is one too. Admissible, and the admissible
+    heuristic for boards without a database.
+    """
+    view = state.region_view()
+    if view is None:
+        return 0
+    graph, conquered, frontier = view
+    database = PatternDatabase.of_graph(graph)
+    if database is None:
+        return admissible_heuristic(state)
+    pending = [(mask, value) for mask, value in database.lookup(conquered) if mask]
+    bound = 0
+    visited = conquered | frontier
+    layer = frontier
+    depth = 0
+    while layer:
+        depth += 1
+        if pending:  # Each pattern is scored at the first layer that holds one of its unconquered regions
+            bound = max([bound] + [depth - 1 + value for mask, value in pending if layer & mask])
+            pending = [(mask, value) for mask, value in pending if not layer & mask]
+        layer = graph.dilate(layer) & ~visited
+        visited |= layer
+    reachable = visited & ~conquered
+    colors = sum(1 for color_mask in graph.color_masks if color_mask & reachable)
+    return max(colors, depth, bound)
+
+
+def _reachable_regions(graph, conquered, frontier):
+    """
+    Runs a BFS over the region graph from the conquered regions. Each region is visited once, so this
+    takes time linear in the number of regions and their adjacencies.
+    :return: A (mask of the reachable regions outside the conquered area, eccentricity) pair
+    """
+    visited = conquered | frontier
+    layer = frontier
+    depth = 0
+    while layer:
+        depth += 1
+        layer = graph.dilate(layer) & ~visited
+        visited |= layer
+    return visited & ~conquered, depth
+
+
+def batch_heuristic(heuristic):
+    """
+    Returns a function of (state, successors) that evaluates the heuristic on a list of successor states of
+    the state at once, so that the work the successors have in common is done once.
+    Heuristics without a batched version are evaluated on one successor after the other.
+    """
+    batch = BATCH_HEURISTICS.get(heuristic)
+    if batch is None:
+        def batch(state, successors):
+            return [heuristic(successor) for successor in successors]
+    return batch
+
+
+def _batch_region_bounds(state, successors):
+    """
+    Returns the (colors remaining, eccentricity) pair of every successor of the state, from a single BFS over
+    the region graph from the state itself. A move absorbs the frontier regions of its color, so:
+        (1) The regions a successor can reach are those the state can reach, less the absorbed ones
+        (2) A region's BFS distance either stays the same or drops by one, and it drops exactly for the
+            regions one layer deeper than a region that dropped, starting from the neighbors of the
+            absorbed regions. Following the drop through the state's BFS layers only visits the regions
+            that got closer, and the eccentricity drops iff the drop reaches every region of the last layer
+    Returns None when the state has no region view, or when its moves may absorb parts of regions.
+    """
+    view = state.region_view()
+    if view is None or not state.whole_region_moves:
+        return None
+    graph, conquered, frontier = view
+    layers = []  # The regions at each BFS distance from the conquered area, starting with the frontier
+    visited = conquered | frontier
+    layer = frontier
+    while layer:
+        layers.append(layer)
+        layer = graph.dilate(layer) & ~visited
+        visited |= layer
+    reachable = visited & ~conquered
+    depth = len(layers)
+
+    bounds = []
+    for successor in successors:
+        absorbed = frontier & graph.color_masks[successor.color]
+        remaining = reachable & ~absorbed
+        colors = sum(1 for color_mask in graph.color_masks if color_mask & remaining)
+        if depth <= 1:
+            eccentricity = 1 if remaining else 0
+        else:
+            closer = graph.dilate(absorbed) & layers[1]
+            distance = 1
+            while closer and distance < depth - 1:
+                distance += 1
+                closer = graph.dilate(closer) & layers[distance]
+            eccentricity = depth - 1 if distance == depth - 1 and closer == layers[-1] else depth
+        bounds.append((colors, eccentricity))
+    return bounds
+
+
+def colors_remaining_batch(state, successors):
+    """The batched version of colors_remaining_heuristic"""
+    bounds = _batch_region_bounds(state, successors)
+    if bounds is None:
+        return [colors_remaining_heuristic(successor) for successor in successors]
+    return [colors for colors, _ in bounds]
+
+
+def eccentricity_batch(state, successors):
+    """The batched version of eccentricity_heuristic"""
+    bounds = _batch_region_bounds(state, successors)
+    if bounds is None:
+        return [eccentricity_heuristic(successor) for successor in successors]
+    return [eccentricity for _, eccentricity in bounds]
+
+
+def admissible_batch(state, successors):
+    """The batched version of admissible_heuristic"""
+    bounds = _batch_region_bounds(state, successors)
+    if bounds is None:
+        return [admissible_heuristic(successor) for successor in successors]
+    return [max(colors, eccentricity) for colors, eccentricity in bounds]
+
+
+# Heuristics whose values are always integers, so A* over unit-cost moves can keep its open list in a BucketQueue
+INTEGER_HEURISTICS = (null_heuristic, colors_remaining_heuristic, eccentricity_heuristic, admissible_heuristic,
+                      pattern_database_heuristic)
+
+# Heuristics that never overestimate, so A* and IDA* return a solution with the fewest moves when guided by them
+ADMISSIBLE_HEURISTICS = (null_heuristic, colors_remaining_heuristic, eccentricity_heuristic, admissible_heuristic,
+                         pattern_database_heuristic)
+
+HEURISTICS = {
+    'null': null_heuristic,
+    'weighted': weighted_sum_heuristic,
+    'colors': colors_remaining_heuristic,
+    'eccentricity': eccentricity_heuristic,
+    'admissible': admissible_heuristic,
+    'pdb': pattern_database_heuristic,
+}
+
+# Older names of the heuristics. The command line used to take 'true' for the weighted sum
+HEURISTIC_ALIASES = {
+    'true': 'weighted',
+}
+
+
+BATCH_HEURISTICS = {
+    colors_remaining_heuristic: colors_remaining_batch,
+    eccentricity_heuristic: eccentricity_batch,
+    admissible_heuristic: admissible_batch,
+}
+
+
+def get_heuristic(name):
+    """Returns the heuristic function registered under the given name or under one of its aliases"""
+    name = HEURISTIC_ALIASES.get(name, name)
+    if name not in HEURISTICS:
+        raise ValueError(f'Unknown heuristic {name}. Please choose one of: {list(HEURISTICS)}')
+    return HEURISTICS[name]
+
+
 if __name__ == "__main__":
     from board import Board
 
@@ -0,0 +1,200 @@
+import numpy as np
+from board import Board
+from geometry import ADJACENT_OFFSETS, KNIGHT_OFFSETS
+from heuristics import ConqueredStats, Heuristics
+
+
+class NumpyBoard(Board):
+    """
+    A Board variant whose grid is a (height, width) uint8 array of indices into Board.PALETTE.
+    Flood fill, equality, hashing and the goal test are whole-array operations, which keeps
+    very large boards (200x200 and up) out of per-cell Python loops.
+    """
+
+    ADJACENT_OFFSETS = ADJACENT_OFFSETS
+    KNIGHT_OFFSETS = KNIGHT_OFFSETS
+    PALETTE_ARRAY = np.array(Board.PALETTE)
+
+    _slices_cache = {}
+
+    def __init__(self, size=(18, 18), starting_point=(0, 0), jokers=0, copy=False):
+        super().__init__(size, starting_point, jokers, copy)
+        if not copy:  # The parent constructor drew a random grid of chars, so the same seed gives the same board
+            self.board = NumpyBoard.encode(self.board)
+
+    @classmethod
+    def from_board(cls, board):
+        """Builds a NumpyBoard holding the same position as the given Board"""
+        new_board = cls((board.height, board.width), board.starting_point, board.jokers, copy=True)
+        new_board.board = NumpyBoard.encode(board.board)
+        new_board.mode = board.mode
+        new_board.joker_locations = set(board.joker_locations)
+        return new_board
+
+    def to_board(self):
+        """Returns a Board holding the same position as this NumpyBoard"""
+        board = Board((self.height, self.width), self.starting_point, self.jokers, copy=True)
+        board.board = NumpyBoard.PALETTE_ARRAY[self.board].tolist()
+        board.mode = self.mode
+        board.joker_locations = set(self.joker_locations)
+        return board
+
+    @staticmethod
+    def encode(grid):
+        """Converts a list of lists of color chars into an array of palette indices"""
+        return np.array([[Board.PALETTE.index(color) for color in row] for row in grid], dtype=np.uint8)
+
+    def copy(self):
+        new_board = NumpyBoard((self.height, self.width), self.starting_point, self.jokers, copy=True)
+        new_board.board = self.board.copy()
+        new_board.mode = self.mode
+        new_board.joker_locations = set(self.joker_locations)
+        return new_board
+
+    def transpose_board(self):
+        """Returns a copy of the transposed board"""
+        new_board = self.copy()
+        new_board.width = self.height
+        new_board.height = self.width
+        new_board.update_geometry()
+        new_board.board = np.ascontiguousarray(self.board.T)
+        new_board.joker_locations = {(col, row) for row, col in self.joker_locations}
+        new_board.starting_point = (self.starting_point[1], self.starting_point[0])
+        return new_board
+
+    def __eq__(self, other):
+        return np.array_equal(self.board, other.board) and self.joker_locations == other.joker_locations
+
+    def __hash__(self):
+        return hash((self.board.tobytes(), frozenset(self.joker_locations)))
+
+    def __str__(self):
+        chars = NumpyBoard.PALETTE_ARRAY[self.board]
+        return ''.join(''.join(' ' + color for color in row) + '\n' for row in chars)
+
+    def full_board(self):
+        """
+        :return: True iff the entire board is colored the same color
+        """
+        return not (self.board != self.board.flat[0]).any()
+
+    def color_at(self, row, col):
+        return Board.PALETTE[self.board[row, col]]
+
+    def color_one_square(self, row, col, color):
+        self.board[row, col] = Board.PALETTE.index(color)
+
+    @classmethod
+    def neighbor_slices(cls, height, width, offsets):
+        """
+        Returns (destination, source) slice pairs that move a whole mask by each of the offsets.
+        Cells that would leave the board are simply not part of the slices.
+        """
+        key = (height, width, tuple(offsets))
+        if key not in cls._slices_cache:
+            slices = []
+            for d_row, d_col in offsets:
+                destination = (slice(max(d_row, 0), max(height + min(d_row, 0), 0)),
+                               slice(max(d_col, 0), max(width + min(d_col, 0), 0)))
+                source = (slice(max(-d_row, 0), max(height + min(-d_row, 0), 0)),
+                          slice(max(-d_col, 0), max(width + min(-d_col, 0), 0)))
+                slices.append((destination, source))
+            cls._slices_cache[key] = slices
+        return cls._slices_cache[key]
+
+    @staticmethod
+    def dilate(mask, slices):
+        """Returns a boolean array of every cell that neighbors a True cell of the mask"""
+        result = np.zeros_like(mask)
+        for destination, source in slices:
+            result[destination] |= mask[source]
+        return result
+
+    def conquered(self):
+        """Returns a boolean array of the cells connected to the starting point through its own color"""
+        offsets = NumpyBoard.KNIGHT_OFFSETS if self.mode == Board.KNIGHT else NumpyBoard.ADJACENT_OFFSETS
+        slices = NumpyBoard.neighbor_slices(self.height, self.width, offsets)
+        remaining = self.board == self.board[self.starting_point]
+        region = np.zeros_like(remaining)
+        region[self.starting_point] = True
+        remaining[self.starting_point] = False
+        frontier = region.copy()
+        while frontier.any():
+            frontier = NumpyBoard.dilate(frontier, slices)
+            frontier &= remaining
+            remaining ^= frontier
+            region |= frontier
+        return region
+
+    def conquered_cells(self):
+        """Returns the 'conquered' area as a set of (row, col) tuples"""
+        rows, cols = self.conquered().nonzero()
+        return set(zip(rows.tolist(), cols.tolist()))
+
+    def conquered_stats(self):
+        """Returns the ConqueredStats of the 'conquered' area. NumpyHeuristics computes them with array operations instead"""
+        return ConqueredStats.of_cells(self.height, self.width, self.conquered_cells())
+
+    def apply_color_move(self, color):
+        """
+        Applies the given color to the board
+        :param color: A color in the form of a single char
+        :return: A sorted list of the (row, col) cells of the jokers the move triggered
+        """
+        colored = self.conquered()
+        triggered = {(row, col) for row, col in self.joker_locations if colored[row, col]}
+        if triggered:
+            mask = np.zeros_like(colored)
+            mask[tuple(zip(*triggered))] = True
+            self.joker_locations -= triggered  # disallow multiple discovery
+            adjacent = NumpyBoard.neighbor_slices(self.height, self.width, NumpyBoard.ADJACENT_OFFSETS)
+            colored |= NumpyBoard.dilate(mask, adjacent)
+        self.board[colored] = Board.PALETTE.index(color)
+        return sorted(triggered)
+
+
+class NumpyHeuristics(Heuristics):
+    """The Heuristics of a NumpyBoard, computed with array operations over the 'conquered' mask"""
+
+    def __init__(self, board):
+        self.board = board
+        self.mask = board.conquered()
+        border = np.ones_like(self.mask)
+        border[1:-1, 1:-1] = False
+        self.border = border
+
+    @property
+    def all_neighbors(self):
+        rows, cols = self.mask.nonzero()
+        return set(zip(rows.tolist(), cols.tolist()))
+
+    def distance_to_corner(self, dist_func=None):
+        if dist_func:
+            return super().distance_to_corner(dist_func)
+        rows, cols = self.mask.nonzero()
+        squared = (rows - self.board.height + 1) ** 2 + (cols - self.board.width + 1) ** 2
+        return float(np.sqrt(squared.min()))
+
+    def number_uncovered(self):
+        return self.mask.size - int(np.count_nonzero(self.mask))
+
+    @staticmethod
+    def _transitions(mask):
+        """Counts the in/out transitions along each row, entering from an 'outside' cell before the first column"""
+        padded = np.zeros((mask.shape[0], mask.shape[1] + 1), dtype=bool)
+        padded[:, 1:] = mask
+        return int(np.count_nonzero(padded[:, 1:] != padded[:, :-1]))
+
+    def _vertical_perimeter_sum(self):
+        return NumpyHeuristics._transitions(self.mask)
+
+    def _horizontal_perimeter_sum(self):
+        return NumpyHeuristics._transitions(self.mask.T)
+
+    def number_border_uncovered(self):
+        total_border = 2 * self.board.height + 2 * (self.board.width - 2)
+        return total_border - int(np.count_nonzero(self.mask & self.border))
+
+    def number_corners_covered(self):
+        last_row, last_col = self.board.height - 1, self.board.width - 1
+        return sum(bool(self.mask[row, col]) for row, col in [(0, 0), (0, last_col), (last_row, 0), (last_row, last_col)])
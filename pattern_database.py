@@ -0,0 +1,265 @@
+"""
+Pattern databases: exact move counts of abstracted sub-problems of a board, precomputed offline.
+A pattern is a cluster of up to PATTERN_SIZE regions of the board's RegionGraph around a region far from the
+starting point. In the abstract sub-problem, every region outside the pattern is a wildcard that any move
+absorbs as soon as it touches the conquered area, so only the pattern regions cost moves. Every move of the
+real game absorbs at least what it absorbs in the abstract one, so the exact number of moves the abstract
+problem needs from the pattern regions that are conquered is a lower bound on the moves the real game needs.
+The count of every subset of the pattern regions is kept in a table of 2 ** len(pattern) bytes.
+The tables of many boards are kept in one file, which is mapped into memory with mmap, so tables are
+only read when a search asks for them. Build a file with e.g.:
+    python pattern_database.py --seeds 0 100 -s 18 18 -o patterns.pdb
+"""
+import hashlib
+import mmap
+import struct
+from weakref import WeakKeyDictionary
+
+FILE_HEADER = struct.Struct('<8sHQQ')  # Magic, version, number of boards, offset of the index
+INDEX_ENTRY = struct.Struct('<16sQ')  # Digest of the board, offset of its patterns
+PATTERN_HEADER = struct.Struct('<H')  # Number of regions in the pattern, followed by their indices as u32
+MAGIC = b'FLOODPDB'
+VERSION = 1
+PATTERN_SIZE = 14
+PATTERNS = 4
+
+
+def board_digest(board):
+    """Returns a 16-byte digest of the board's record, which identifies the board its tables were built for"""
+    from board_format import encode_board
+    return hashlib.blake2b(encode_board(board), digest_size=16).digest()
+
+
+def choose_patterns(graph, count=PATTERNS, size=PATTERN_SIZE):
+    """
+    Returns up to count patterns, each a list of up to size region indices: the regions closest, in the region
+    graph, to a region as far as possible from the starting region that no earlier pattern holds.
+    The starting region is never part of a pattern, since it is always conquered
+    """
+    distance = {graph.start: 0}
+    layer = [graph.start]
+    while layer:
+        next_layer = []
+        for region in layer:
+            for neighbor in graph.regions(graph.neighbors[region]):
+                if neighbor not in distance:
+                    distance[neighbor] = distance[region] + 1
+                    next_layer.append(neighbor)
+        layer = next_layer
+
+    patterns = []
+    taken = {graph.start}
+    for center in sorted(distance, key=lambda region: -distance[region]):
+        if len(patterns) == count:
+            break
+        if center in taken:
+            continue
+        pattern = [center]
+        seen = {center}
+        queue = [center]
+        while queue and len(pattern) < size:  # A BFS from the far region, over regions that are not taken
+            region = queue.pop(0)
+            for neighbor in graph.regions(graph.neighbors[region]):
+                if neighbor not in seen and neighbor not in taken and len(pattern) < size:
+                    seen.add(neighbor)
+                    pattern.append(neighbor)
+                    queue.append(neighbor)
+        taken.update(pattern)
+        patterns.append(sorted(pattern))
+    return patterns
+
+
+def build_table(graph, pattern):
+    """
+    Returns the table of the pattern: for every subset of its regions, given as a bitmask over the positions
+    of the regions in the pattern, the fewest moves that conquer every pattern region in the abstract problem
+    """
+    pattern_mask = sum(1 << region for region in pattern)
+    size = len(pattern)
+
+    # The abstract graph: node i < size is the pattern's i-th region, and every other node is a connected
+    # component of wildcard regions, which are always absorbed together
+    node_of = {region: index for index, region in enumerate(pattern)}
+    nodes = size
+    for region in range(len(graph)):
+        if region not in node_of:
+            stack = [region]
+            node_of[region] = nodes
+            while stack:
+                for neighbor in graph.regions(graph.neighbors[stack.pop()] & ~pattern_mask):
+                    if neighbor not in node_of:
+                        node_of[neighbor] = nodes
+                        stack.append(neighbor)
+            nodes += 1
+    adjacent = [0] * nodes
+    for region in range(len(graph)):
+        for neighbor in graph.regions(graph.neighbors[region]):
+            adjacent[node_of[region]] |= 1 << node_of[neighbor]
+    wildcards = ((1 << nodes) - 1) & ~((1 << size) - 1)
+    colors = [0] * len(graph.color_masks)
+    for index, region in enumerate(pattern):
+        colors[graph.colors[region]] |= 1 << index
+    start = 1 << node_of[graph.start]
+
+    def grow(conquered, allowed):
+        """Absorbs the allowed nodes adjacent to the conquered ones until none are left"""
+        while True:
+            grown = 0
+            remaining = conquered
+            while remaining:
+                low = remaining & -remaining
+                grown |= adjacent[low.bit_length() - 1]
+                remaining ^= low
+            grown &= allowed & ~conquered
+            if not grown:
+                return conquered
+            conquered |= grown
+
+    full = (1 << size) - 1
+    table = bytearray(full + 1)
+    for subset in range(full - 1, -1, -1):  # A move only adds regions, so every successor has a larger bitmask
+        conquered = grow(start | subset, wildcards)
+        best = None
+        for color_mask in colors:
+            successor = grow(conquered, wildcards | color_mask) & full
+            if successor != subset and (best is None or table[successor] < best):
+                best = table[successor]
+        table[subset] = best + 1
+    return table
+
+
+class PatternDatabase:
+    """
+    The patterns of one board and their tables, as bytes or as views into a mapped file.
+    Each pattern is kept as (regions, region mask, table)
+    """
+
+    _files = {}  # Path: (mapped file, dict from board digest to offset) of every file loaded by load()
+    _by_graph = WeakKeyDictionary()  # The database of each RegionGraph that was looked up, or None
+
+    def __init__(self, patterns):
+        self.patterns = [(regions, sum(1 << region for region in regions), table) for regions, table in patterns]
+
+    @classmethod
+    def build(cls, board, count=PATTERNS, size=PATTERN_SIZE):
+        """Builds the patterns of the given board, which must not have any jokers"""
+        from region_graph import RegionGraph
+        graph = RegionGraph(board)
+        return cls([(pattern, build_table(graph, pattern)) for pattern in choose_patterns(graph, count, size)])
+
+    @classmethod
+    def load(cls, path):
+        """Maps the given file into memory, so its tables are used for the boards they were built for"""
+        if path in cls._files:
+            return
+        with open(path, 'rb') as database_file:
+            data = mmap.mmap(database_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, boards, index = FILE_HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} pattern database file')
+        offsets = dict(INDEX_ENTRY.iter_unpack(data[index:index + boards * INDEX_ENTRY.size]))
+        cls._files[path] = memoryview(data), offsets
+        cls._by_graph = WeakKeyDictionary()  # Boards that had no database may have one now
+
+    @classmethod
+    def of_graph(cls, graph):
+        """Returns the database of the board of the given RegionGraph from the loaded files, or None"""
+        if graph in cls._by_graph:
+            return cls._by_graph[graph]
+        database = None
+        if cls._files:
+            digest = board_digest(graph.board)
+            for data, offsets in cls._files.values():
+                if digest in offsets:
+                    database = cls.decode(data, offsets[digest])
+                    break
+        cls._by_graph[graph] = database
+        return database
+
+    @classmethod
+    def decode(cls, data, offset):
+        """Returns the database stored at the given offset of a file, whose tables are views into the file"""
+        count = PATTERN_HEADER.unpack_from(data, offset)[0]
+        offset += PATTERN_HEADER.size
+        patterns = []
+        for _ in range(count):
+            size = PATTERN_HEADER.unpack_from(data, offset)[0]
+            offset += PATTERN_HEADER.size
+            regions = list(struct.unpack_from(f'<{size}I', data, offset))
+            offset += 4 * size
+            patterns.append((regions, data[offset:offset + (1 << size)]))
+            offset += 1 << size
+        return cls(patterns)
+
+    def encode(self):
+        """Returns the bytes of the database in the file format"""
+        parts = [PATTERN_HEADER.pack(len(self.patterns))]
+        for regions, mask, table in self.patterns:
+            parts += [PATTERN_HEADER.pack(len(regions)), struct.pack(f'<{len(regions)}I', *regions), bytes(table)]
+        return b''.join(parts)
+
+    def lookup(self, conquered):
+        """
+        Returns a list of the (region mask, table value) pair of every pattern, for the given mask of conquered regions
+        """
+        values = []
+        for regions, mask, table in self.patterns:
+            subset = 0
+            for index, region in enumerate(regions):
+                if conquered >> region & 1:
+                    subset |= 1 << index
+            values.append((mask & ~conquered, table[subset]))
+        return values
+
+
+def write_databases(path, databases):
+    """
+    Writes the databases of several boards to one file
+    :param databases: An iterable of (board digest, PatternDatabase) pairs
+    """
+    with open(path, 'wb') as database_file:
+        database_file.write(FILE_HEADER.pack(MAGIC, VERSION, 0, 0))  # Filled in once the index is written
+        offsets = []
+        for digest, database in databases:
+            offsets.append((digest, database_file.tell()))
+            database_file.write(database.encode())
+        index = database_file.tell()
+        for digest, offset in offsets:
+            database_file.write(INDEX_ENTRY.pack(digest, offset))
+        database_file.seek(0)
+        database_file.write(FILE_HEADER.pack(MAGIC, VERSION, len(offsets), index))
+
+
+if __name__ == "__main__":
+    import argparse
+    from batch_solve import make_board
+    from board_format import Corpus
+
+    parser = argparse.ArgumentParser('Build the pattern databases of a range of boards and write them to one file')
+    parser.add_argument('--seeds', nargs=2, dest='seeds', type=int, default=None,
+                        help='first seed and end of the range, or of the corpus indices when a corpus is given')
+    parser.add_argument('--corpus', dest='corpus', type=str, default=None, help='build for the boards of a corpus file')
+    parser.add_argument('-s', '--size', nargs=2, dest='size', type=int, default=(18, 18))
+    parser.add_argument('-p', '--starting_point', nargs=2, dest='start_point', type=int, default=(0, 0))
+    parser.add_argument('-k', '--knight', dest='knight', action='store_true')
+    parser.add_argument('--patterns', dest='patterns', type=int, default=PATTERNS)
+    parser.add_argument('--pattern_size', dest='pattern_size', type=int, default=PATTERN_SIZE,
+                        help='regions per pattern, each pattern takes 2 ** pattern_size bytes')
+    parser.add_argument('-o', '--output', dest='output', type=str, required=True)
+    args = parser.parse_args()
+
+    if args.seeds is None and args.corpus is None:
+        parser.error('Either --seeds or --corpus is required')
+    if args.corpus:
+        corpus = Corpus.get(args.corpus)
+        boards = (corpus[index] for index in range(*(args.seeds or (0, len(corpus)))))
+    else:
+        boards = (make_board(seed, args.size, args.start_point, 0, args.knight) for seed in range(*args.seeds))
+
+    def databases():
+        for board in boards:
+            if board.joker_locations:  # Jokers recolor cells across regions, so their boards have no patterns
+                continue
+            yield board_digest(board), PatternDatabase.build(board, args.patterns, args.pattern_size)
+
+    write_databases(args.output, databases())
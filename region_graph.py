@@ -0,0 +1,249 @@
+from board import Board
+from heuristics import ConqueredStats
+from zobrist import ZobristTable
+
+
+class RegionGraph:
+    """
+    Collapses a board into a graph of same-color connected components (regions).
+    Regions are connected through the neighborhood of the board's mode, and two regions are adjacent
+    if any of their cells are. Sets of regions are stored as integer bitmasks over the region indices,
+    so a flood move becomes a union of the neighbor masks of the regions it absorbs.
+    The graph is built from a Board or a NumpyBoard, and a BitBoard is read through its to_board().
+    """
+
+    def __init__(self, board):
+        if not hasattr(board, 'joker_locations'):
+            board = board.to_board()
+        if board.joker_locations:
+            raise ValueError('Jokers recolor single cells across region boundaries and cannot be compressed')
+        self.board = board.copy()
+        self.height, self.width = board.height, board.width
+        self.starting_point = board.starting_point
+        self.mode = board.mode
+
+        self.region_of = {}  # Maps each (row, col) cell to the index of its region
+        self.cells = []  # The cells of each region
+        self.colors = []  # The palette index of each region
+        region_at = [None] * (self.height * self.width)  # The region of each flat index, row * width + col
+        # Read through color_at(), which every board type implements, so the fill never touches the grid itself
+        color_at = [board.color_at(row, col) for row in range(self.height) for col in range(self.width)]
+        neighbor_table = board.geometry.neighbors
+        for start, color in enumerate(color_at):
+            if region_at[start] is None:
+                index = len(self.cells)
+                region_at[start] = index
+                region = set()
+                stack = [start]
+                while stack:
+                    cell = stack.pop()
+                    region.add(divmod(cell, self.width))
+                    for neighbor in neighbor_table[cell]:
+                        if region_at[neighbor] is None and color_at[neighbor] == color:
+                            region_at[neighbor] = index
+                            stack.append(neighbor)
+                for cell in region:
+                    self.region_of[cell] = index
+                self.cells.append(region)
+                self.colors.append(Board.PALETTE.index(color))
+
+        self.neighbors = [0] * len(self.cells)  # A mask of the regions adjacent to each region
+        for index, neighbors in enumerate(board.geometry.neighbors):
+            region = region_at[index]
+            for neighbor in neighbors:
+                other = region_at[neighbor]
+                if other != region:
+                    self.neighbors[region] |= 1 << other
+
+        self.color_masks = [0] * len(Board.PALETTE)  # A mask of the regions of each color
+        for region, color in enumerate(self.colors):
+            self.color_masks[color] |= 1 << region
+        self.all_regions = (1 << len(self.cells)) - 1
+        self.start = self.region_of[self.starting_point]
+        self.zobrist = ZobristTable.get(len(self.cells), len(Board.PALETTE) + 1)
+
+        # The cells of each region as a bitmask in BitBoard order, bit (row * width + col)
+        self.bit_masks = [sum(1 << (row * self.width + col) for row, col in cells) for cells in self.cells]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def regions(self, mask):
+        """Yields the index of every region set in the mask"""
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def regions_touching(self, cell_mask):
+        """Returns a mask of the regions with at least one cell in the given BitBoard cell mask"""
+        result = 0
+        for region, bit_mask in enumerate(self.bit_masks):
+            if bit_mask & cell_mask:
+                result |= 1 << region
+        return result
+
+    def dilate(self, regions):
+        """Returns a mask of the regions adjacent to any region in the given mask"""
+        neighbors = self.neighbors
+        grown = 0
+        while regions:  # Inlined regions(), since every BFS over the graph runs through this loop
+            low = regions & -regions
+            grown |= neighbors[low.bit_length() - 1]
+            regions ^= low
+        return grown
+
+    def frontier_of(self, regions):
+        """Returns a mask of the regions adjacent to, but not in, the given mask of regions"""
+        return self.dilate(regions) & ~regions
+
+    def start_state(self):
+        """Returns the RegionState of the board the graph was built from"""
+        start = 1 << self.start
+        return RegionState(self, start, self.colors[self.start], self.neighbors[self.start])
+
+
+class RegionState:
+    """
+    An immutable search state over a RegionGraph: the mask of conquered regions and their current color.
+    The frontier, the mask of regions adjacent to the conquered ones, is carried along so that a move
+    only looks at the neighbors of the regions it absorbs. The ConqueredStats of the conquered area are
+    updated from the parent's stats, for the absorbed regions only, the first time they are asked for.
+    """
+
+    COLORS = Board.COLORS
+
+    # Zobrist value of a conquered region. The starting region's key for values 1.. encodes the color
+    CONQUERED_KEY = 0
+
+    __slots__ = ('graph', 'conquered', 'color', 'frontier', 'key', 'stats', 'parent')
+
+    def __init__(self, graph, conquered, color, frontier, key=None, stats=None, parent=None):
+        self.graph = graph
+        self.conquered = conquered
+        self.color = color
+        self.frontier = frontier
+        if key is None:
+            key = graph.zobrist.mask_key(conquered, RegionState.CONQUERED_KEY) ^ \
+                graph.zobrist.keys[graph.start][color + 1]
+        self.key = key
+        self.stats = stats  # Computed by conquered_stats() when needed
+        self.parent = parent  # The state whose stats are updated to get this state's stats, until they are computed
+
+    @property
+    def height(self):
+        return self.graph.height
+
+    @property
+    def width(self):
+        return self.graph.width
+
+    @property
+    def starting_point(self):
+        return self.graph.starting_point
+
+    def successor(self, color):
+        """
+        Returns the state reached by playing the given color: every frontier region of that color is absorbed
+        :param color: A color in the form of a single char
+        """
+        graph = self.graph
+        target = Board.PALETTE.index(color)
+        start_keys = graph.zobrist.keys[graph.start]
+        key = self.key ^ start_keys[self.color + 1] ^ start_keys[target + 1]
+        absorbed = self.frontier & graph.color_masks[target]
+        if not absorbed:
+            return RegionState(graph, self.conquered, target, self.frontier, key, self.stats, self.parent)
+
+        conquered = self.conquered | absorbed
+        frontier = self.frontier | graph.dilate(absorbed)
+        key ^= graph.zobrist.mask_key(absorbed, RegionState.CONQUERED_KEY)
+        return RegionState(graph, conquered, target, frontier & ~conquered, key, parent=self)
+
+    def full_board(self):
+        """
+        :return: True iff the entire board is colored the same color
+        """
+        return (self.graph.color_masks[self.color] | self.conquered) == self.graph.all_regions
+
+    def moves(self, forced=False):
+        """
+        Returns the colors worth playing, in the order of COLORS: those present on the frontier.
+        Any other color only recolors the conquered regions without absorbing one.
+        :param forced: If True and a color's remaining regions all border the conquered ones, only that color
+        is returned, since eliminating a color right away never lengthens a solution
+        """
+        graph = self.graph
+        present = [index for index, color_mask in enumerate(graph.color_masks) if color_mask & self.frontier]
+        if not present:  # Nothing reachable is left, only the color of the unreachable regions may still matter
+            return [color for color in self.COLORS if color != Board.PALETTE[self.color]]
+        if forced:
+            for index in present:
+                if not graph.color_masks[index] & ~self.conquered & ~self.frontier:
+                    return [Board.PALETTE[index]]
+        return [color for color in self.COLORS if Board.PALETTE.index(color) in present]
+
+    def pack(self):
+        """Returns the state without its graph, as a tuple that is cheap to send to another process"""
+        return self.conquered, self.color, self.frontier, self.key, self.stats
+
+    def unpack(self, packed):
+        """Returns the state that pack() described, over the same graph as this state"""
+        return RegionState(self.graph, *packed)
+
+    def region_view(self):
+        """Returns the RegionGraph of the state with the masks of its conquered and frontier regions"""
+        return self.graph, self.conquered, self.frontier
+
+    @property
+    def whole_region_moves(self):
+        """Always True, since every move absorbs whole regions"""
+        return True
+
+    def conquered_cells(self):
+        """Returns the 'conquered' area as a set of (row, col) tuples"""
+        cells = set()
+        for region in self.graph.regions(self.conquered):
+            cells |= self.graph.cells[region]
+        return cells
+
+    def conquered_stats(self):
+        """Returns the running ConqueredStats of the 'conquered' area"""
+        if self.stats is None:
+            graph = self.graph
+            if self.parent is None:
+                self.stats = ConqueredStats.of_cells(graph.height, graph.width, self.conquered_cells())
+            else:  # Only the cells of the regions absorbed by the last move are new
+                parent = self.parent
+                new_cells = []
+                for region in graph.regions(self.conquered & ~parent.conquered):
+                    new_cells.extend(graph.cells[region])
+                self.stats = parent.conquered_stats().absorb(
+                    new_cells, lambda row, col: (parent.conquered >> graph.region_of[(row, col)]) & 1)
+                self.parent = None
+        return self.stats
+
+    def to_board(self):
+        """Returns a Board holding the position this state describes"""
+        board = self.graph.board.copy()
+        board.color_neighbors(self.conquered_cells(), Board.PALETTE[self.color])
+        return board
+
+    def __eq__(self, other):
+        return self.key == other.key and self.conquered == other.conquered and self.color == other.color
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return self.key
+
+    def __lt__(self, other):
+        return True
+
+    def __repr__(self):
+        return f"RegionState(conquered={bin(self.conquered).count('1')}/{len(self.graph)}, " \
+               f"color={Board.PALETTE[self.color]})"
+
+    def __str__(self):
+        return str(self.to_board())
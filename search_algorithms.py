@@ -1,13 +1,23 @@
+import heapq
+import multiprocessing
+from itertools import count
+from queue import Empty
+from time import perf_counter
 from data_structures import *
-from heuristics import Heuristics
+from heuristics import ADMISSIBLE_HEURISTICS, INTEGER_HEURISTICS, batch_heuristic, get_heuristic, null_heuristic, \
+    weighted_sum_heuristic
 
 
-def search_helper(problem, data_struct):
+def search_helper(problem, data_struct, stats=None):
+    if stats is not None:
+        problem = stats.instrument(problem)[0]
     visited = dict()
     data_struct.push(problem.get_start_state())
     visited[problem.get_start_state()] = None, None
     while not data_struct.is_empty():
         temp = data_struct.pop()
+        if stats is not None:
+            stats.expand(temp, _depth(visited, temp) if stats.histograms else None, len(data_struct))
         if problem.is_goal_state(temp):
             actions = []
             curr = temp
@@ -20,62 +30,413 @@ def search_helper(problem, data_struct):
                 if successor[0] not in visited:
                     data_struct.push(successor[0])
                     visited[successor[0]] = temp, successor[1]  # Key=State, Value=(PrevState, Action)
+                elif stats is not None:
+                    stats.duplicates += 1
     return visited.keys()
 
 
-def depth_first_search(problem):
+def _depth(visited, state):
+    """Returns the number of moves on the path to the state, walked back through the visited parents"""
+    depth = 0
+    while visited[state][0] is not None:
+        state = visited[state][0]
+        depth += 1
+    return depth
+
+
+def depth_first_search(problem, stats=None):
     """
     Search the deepest nodes in the search tree first.
     """
-    return search_helper(problem, Stack())
+    return search_helper(problem, Stack(), stats)
 
 
-def breadth_first_search(problem):
+def breadth_first_search(problem, stats=None):
     """
     Search the shallowest nodes in the search tree first.
     """
-    return search_helper(problem, Queue())
+    return search_helper(problem, Queue(), stats)
 
 
-def uniform_cost_search(problem):
+def uniform_cost_search(problem, stats=None):
     """
     Search the node of least total cost first.
     """
-    return a_star_search(problem, null=True)
+    return a_star_search(problem, null_heuristic, stats)
 
 
-def a_star_search(problem, null=False):
+def a_star_search(problem, heuristic=weighted_sum_heuristic, stats=None):
     """
     Search the node that has the lowest combined cost and heuristic first.
+    States are keyed by their own hash, so the transposition table never builds a string of the board.
+    A state reached again by a cheaper path is pushed again, so an admissible heuristic yields an optimal solution.
+    Integer heuristics keep the open list in a BucketQueue, which breaks ties toward the node of higher cost,
+    and any other heuristic in a heap. The heuristic is evaluated on all of the new successors of a node at once.
+    :param stats: A SearchStats object to record the search in, or None
     """
-    visited = {str(problem.get_start_state()): (None, None)}
-    p_queue = PriorityQueue()
+    if heuristic in INTEGER_HEURISTICS:
+        p_queue = BucketQueue(BucketQueue.HIGHER_COST, lambda item: item[1])
+    else:
+        p_queue = PriorityQueue()
+    evaluate = batch_heuristic(heuristic)
+    if stats is not None:
+        problem, evaluate = stats.instrument(problem, evaluate)
+    visited = {problem.get_start_state(): (None, None, 0)}  # Key=State, Value=(PrevState, Action, Cost)
     p_queue.push((problem.get_start_state(), 0), 0)
     while not p_queue.is_empty():
         temp_state, total_cost = p_queue.pop()
+        if total_cost > visited[temp_state][2]:  # A cheaper path to this state was found after it was pushed
+            continue
+        if stats is not None:
+            stats.expand(temp_state, total_cost, len(p_queue))
         if problem.is_goal_state(temp_state):
             actions = []
-            curr = str(temp_state)
+            curr = temp_state
             while visited[curr][0] is not None:
                 actions.insert(0, visited[curr][1])
-                curr = str(visited[curr][0])
+                curr = visited[curr][0]
             return actions
         else:
+            new_states = []
             for successor in problem.get_successors(temp_state):
-                str_state = str(successor[0])
-                if str_state not in visited:
-                    heuristic_obj = Heuristics(successor[0])
-                    visited[str_state] = temp_state, successor[1]
-                    new_total_cost = total_cost + successor[2]
-                    p_queue.push((successor[0], new_total_cost), new_total_cost + heuristic_obj.get_weighted_sum(null=null))
+                new_total_cost = total_cost + successor[2]
+                if successor[0] not in visited or new_total_cost < visited[successor[0]][2]:
+                    visited[successor[0]] = temp_state, successor[1], new_total_cost
+                    new_states.append((successor[0], new_total_cost))
+                elif stats is not None:
+                    stats.duplicates += 1
+            if new_states:
+                values = evaluate(temp_state, [state for state, _ in new_states])
+                for (state, new_total_cost), value in zip(new_states, values):
+                    p_queue.push((state, new_total_cost), new_total_cost + value)
+
+
+def parallel_a_star_search(problem, heuristic=weighted_sum_heuristic, workers=None):
+    """
+    Hash-distributed A* (HDA*) over a pool of worker processes.
+    Every state is owned by the worker its hash maps to, and each worker runs A* over its own open and closed
+    lists. Successors owned by another worker are sent to that worker's queue in batches, so the workers
+    never wait on each other while searching. A found goal only becomes the incumbent solution: the workers
+    go on until no open list holds a node cheaper than it, so an admissible heuristic yields an optimal
+    solution, like a_star_search.
+    The states must provide pack() and unpack(), and the heuristic must be picklable.
+    The number of nodes each worker expanded is stored in problem.expanded_per_worker.
+    :param workers: The number of worker processes, the number of CPUs by default
+    """
+    workers = workers or multiprocessing.cpu_count()
+    context = multiprocessing.get_context()
+    shared = _HDAShared(context, workers)
+    start = problem.get_start_state()
+    shared.sent[0] = 1  # The start state counts as a message, so the search cannot end before it is received
+    shared.inboxes[hash(start) % workers].put([(start.pack(), 0, 0, '')])
+    processes = [context.Process(target=_hda_worker, args=(index, problem, heuristic, shared), daemon=True)
+                 for index in range(workers)]
+    for process in processes:
+        process.start()
+
+    while not shared.done.wait(0.005):
+        with shared.lock:  # Every worker is out of cheap nodes and no batch is still on its way
+            if all(shared.idle) and sum(shared.sent) == sum(shared.received):
+                shared.done.set()
+        if any(process.exitcode not in (None, 0) for process in processes):
+            shared.done.set()
+            raise RuntimeError('A parallel A* worker process failed')
+
+    solution = None
+    expanded = [0] * workers
+    for _ in range(workers):  # Each worker reports its expanded count last, after any solution it found
+        message = shared.results.get()
+        while message[0] == 'solution':
+            if solution is None or message[1] < solution[0]:
+                solution = message[1:]
+            message = shared.results.get()
+        expanded[message[1]] = message[2]
+    for process in processes:
+        process.join()
+    problem.expanded_per_worker = expanded
+    problem.expanded = sum(expanded)
+    return list(solution[1]) if solution is not None else None
+
+
+class _HDAShared:
+    """The queues and counters the parallel A* workers share with each other and with the coordinator"""
+
+    def __init__(self, context, workers):
+        self.inboxes = [context.Queue() for _ in range(workers)]
+        self.results = context.Queue()
+        self.lock = context.Lock()
+        self.incumbent = context.Value('d', float('inf'), lock=False)  # Cost of the best solution found so far
+        self.sent = context.Array('i', workers, lock=False)  # Batches each worker sent
+        self.received = context.Array('i', workers, lock=False)  # Batches each worker received
+        self.idle = context.Array('b', workers, lock=False)  # Whether each worker is out of nodes cheaper than the incumbent
+        self.done = context.Event()
+
+
+# Number of nodes a parallel A* worker expands between flushing its outgoing batches and reading its inbox
+HDA_BATCH = 64
+
+
+def _hda_worker(index, problem, heuristic, shared):
+    """
+    The search loop of one parallel A* worker. Open list entries are (priority, -cost, tie, state, actions),
+    where actions is the string of moves leading to the state. Ties on the priority go to the deepest node.
+    """
+    workers = len(shared.inboxes)
+    inbox = shared.inboxes[index]
+    start = problem.get_start_state()
+    open_list = []
+    best = dict()  # Key=State, Value=Cheapest cost found so far
+    outboxes = [[] for _ in range(workers)]
+    tie = count()
+
+    def has_work():
+        return open_list and open_list[0][0] < shared.incumbent.value
+
+    while not shared.done.is_set():
+        batches = []
+        try:  # Block for a moment only when there is nothing else to do
+            batches.append(inbox.get(not has_work(), 0.005))
+            while True:
+                batches.append(inbox.get_nowait())
+        except Empty:
+            pass
+        if batches:
+            with shared.lock:
+                shared.received[index] += len(batches)
+                shared.idle[index] = 0
+            for batch in batches:
+                for packed, cost, priority, actions in batch:
+                    state = start.unpack(packed)
+                    if state not in best or cost < best[state]:
+                        best[state] = cost
+                        heapq.heappush(open_list, (priority, -cost, next(tie), state, actions))
+
+        for _ in range(HDA_BATCH):
+            if not has_work():
+                break
+            priority, cost, _, state, actions = heapq.heappop(open_list)
+            cost = -cost
+            if cost > best[state]:  # A cheaper path to this state was found after it was pushed
+                continue
+            if problem.is_goal_state(state):
+                with shared.lock:
+                    if cost < shared.incumbent.value:
+                        shared.incumbent.value = cost
+                        shared.results.put(('solution', cost, actions))
+                continue
+            for successor, action, step_cost in problem.get_successors(state):
+                new_cost = cost + step_cost
+                new_priority = new_cost + heuristic(successor)
+                if new_priority >= shared.incumbent.value:
+                    continue
+                owner = hash(successor) % workers
+                if owner != index:
+                    outboxes[owner].append((successor.pack(), new_cost, new_priority, actions + action))
+                elif successor not in best or new_cost < best[successor]:
+                    best[successor] = new_cost
+                    heapq.heappush(open_list, (new_priority, -new_cost, next(tie), successor, actions + action))
+
+        for owner, outbox in enumerate(outboxes):
+            if outbox:
+                with shared.lock:
+                    shared.sent[index] += 1
+                shared.inboxes[owner].put(outbox)
+                outboxes[owner] = []
+        if not has_work():
+            with shared.lock:
+                shared.idle[index] = 1
+    shared.results.put(('expanded', index, problem.expanded))
+
+
+def anytime_search(problem, heuristic=weighted_sum_heuristic, time_limit=None, node_limit=None, initial=None,
+                   stats=None, stop=None):
+    """
+    Beam search with widening beams, as an anytime algorithm. Each pass only keeps the most promising states
+    of every depth, as ranked by the heuristic, starting with a greedy pass that keeps one, and the beam width
+    doubles after every pass. A pass never goes deeper than the best solution found so far.
+    The heuristic is evaluated on all of the new successors of a state at once.
+    This is a generator that yields every solution shorter than the ones before it. It stops when either
+    budget runs out, when it is stopped, or after a pass that never had to drop a state, since its solution is then
+    the shortest.
+    :param time_limit: Seconds after which the search stops, or None
+    :param node_limit: Number of nodes after whose expansion the search stops, or None
+    :param initial: A solution that is already known, or None. Only shorter solutions are yielded
+    :param stats: A SearchStats object to record the search in, or None
+    :param stop: A threading.Event that stops the search before the next expansion once it is set, or None
+    """
+    evaluate = batch_heuristic(heuristic)
+    if stats is not None:
+        problem, evaluate = stats.instrument(problem, evaluate)
+    deadline = perf_counter() + time_limit if time_limit is not None else None
+    start = problem.get_start_state()
+    if problem.is_goal_state(start):
+        yield []
+        return
+    expanded = 0
+    best = initial
+    width = 1
+    while True:
+        beam = [(start, '')]
+        seen = {start}
+        truncated = False
+        found = None
+        depth = 0
+        while beam and found is None and (best is None or depth + 1 < len(best)):
+            candidates = []  # (heuristic, tie, state, actions) of every new state one move deeper
+            for state, actions in beam:
+                if (deadline is not None and perf_counter() >= deadline) or \
+                        (node_limit is not None and expanded >= node_limit) or (stop is not None and stop.is_set()):
+                    return
+                expanded += 1
+                if stats is not None:
+                    stats.expand(state, depth, len(beam))
+                new_states = []
+                for successor, action, _ in problem.get_successors(state):
+                    if successor in seen:
+                        if stats is not None:
+                            stats.duplicates += 1
+                        continue
+                    seen.add(successor)
+                    if problem.is_goal_state(successor):
+                        found = actions + action
+                        break
+                    new_states.append((successor, actions + action))
+                if found is not None:
+                    break
+                if new_states:
+                    values = evaluate(state, [successor for successor, _ in new_states])
+                    for (successor, successor_actions), value in zip(new_states, values):
+                        candidates.append((value, len(candidates), successor, successor_actions))
+            if len(candidates) > width:
+                truncated = True
+                candidates = heapq.nsmallest(width, candidates)
+            beam = [(state, actions) for _, _, state, actions in candidates]
+            depth += 1
+        if found is not None:
+            best = found
+            yield list(best)
+        if not truncated:
+            return
+        width *= 2
+
+
+# Bytes of the transposition table of IDA* when run_search_algorithm is not given a limit
+IDA_TABLE_BYTES = 64 * 1024 * 1024
+
+
+def ida_star_search(problem, heuristic=weighted_sum_heuristic, table_bytes=IDA_TABLE_BYTES, stats=None):
+    """
+    Iterative deepening A*: repeated depth-first searches that cut off every node whose cost plus heuristic
+    exceeds a bound, which starts at the heuristic of the start state and grows to the smallest value that
+    was cut off. Only the current path is kept, so an admissible heuristic yields an optimal solution in
+    memory that does not grow with the search.
+    Transpositions are caught by a TranspositionTable of at most table_bytes bytes: a state already reached
+    during the iteration at no higher cost is not searched again. A state evicted from the table is simply
+    searched again, so the limit only trades memory for time. Entries are matched by the 64-bit hash of the
+    state alone, so two states with the same hash are taken for one, and a state may be pruned wrongly: the
+    solution is optimal only up to such hash collisions, which are rare enough to ignore in practice.
+    :param stats: A SearchStats object to record the search in, or None. The open list is the current path
+    """
+    if stats is not None:
+        problem, heuristic = stats.instrument(problem, heuristic)
+    table = TranspositionTable(table_bytes)
+    start = problem.get_start_state()
+    path = []
+    found = []
+
+    def search(state, cost, bound, iteration):
+        """Returns the smallest cost plus heuristic cut off below the state, or None if a goal was found"""
+        priority = cost + heuristic(state)
+        if priority > bound:
+            return priority
+        if problem.is_goal_state(state):
+            found.append(list(path))
+            return None
+        key = hash(state) & 0xFFFFFFFFFFFFFFFF
+        stored = table.lookup(key, iteration)
+        if stored is not None and stored <= cost:
+            if stats is not None:
+                stats.duplicates += 1
+            return float('inf')
+        table.store(key, cost, iteration)
+        if stats is not None:
+            stats.expand(state, cost, len(path))
+        minimum = float('inf')
+        for successor, action, step_cost in problem.get_successors(state):
+            path.append(action)
+            result = search(successor, cost + step_cost, bound, iteration)
+            path.pop()
+            if result is None:
+                return None
+            minimum = min(minimum, result)
+        return minimum
+
+    bound = heuristic(start)
+    iteration = 0
+    while bound != float('inf'):
+        iteration += 1
+        bound = search(start, 0, bound, iteration)
+        if bound is None:
+            return found[0]
+    return None
+
+
+# Seconds the anytime search runs for when run_search_algorithm is not given a time limit
+ANYTIME_TIME_LIMIT = 1
+
+
+def proves_optimal(algo_name, heuristic):
+    """
+    Returns True iff the named search always returns a solution with the fewest moves.
+    For IDA* this holds only up to collisions of the 64-bit state hashes in its TranspositionTable
+    """
+    if algo_name in ('bfs', 'ucs'):
+        return True
+    return algo_name in ('astar', 'hda', 'ida') and get_heuristic(heuristic) in ADMISSIBLE_HEURISTICS
+
+
+def run_search_algorithm(algo_name, problem, heuristic='weighted', workers=None, time_limit=None, table_bytes=None,
+                         stats=None, cache=None):
+    """
+    Runs the named search algorithm on the problem
+    :param algo_name: One of 'bfs', 'dfs', 'ucs', 'astar', 'hda' (parallel A*), 'anytime' and 'ida'
+    :param heuristic: The name of the heuristic A* uses, one of the keys of heuristics.HEURISTICS
+    :param workers: The number of worker processes parallel A* uses, the number of CPUs by default
+    :param time_limit: Seconds the anytime search runs for before returning its best solution
+    :param table_bytes: Bytes of the transposition table of IDA*
+    :param stats: A SearchStats object to record the search in, or None. The parallel A* search does not record one
+    :param cache: A SolutionCache to look the start state up in before searching, and to store the solution in,
+    or None. A search that always finds a solution with the fewest moves only takes a solution proven optimal
+    :return: The solution as a list of colors. The anytime search returns None if its time limit ran out before it
+    found one
+    """
+    optimal = proves_optimal(algo_name, heuristic)
+    solution = cache.lookup(problem.get_start_state(), optimal) if cache is not None else None
+    if solution is None:
+        solution = _run_search_algorithm(algo_name, problem, heuristic, workers, time_limit, table_bytes, stats)
+        if cache is not None and isinstance(solution, list):
+            cache.store(problem.get_start_state(), solution, optimal)
+    if stats is not None:
+        stats.finish()
+    return solution
 
 
-def run_search_algorithm(algo_name, problem, heuristic=False):
+def _run_search_algorithm(algo_name, problem, heuristic, workers, time_limit, table_bytes, stats):
     if algo_name == 'bfs':
-        return breadth_first_search(problem)
+        return breadth_first_search(problem, stats)
     elif algo_name == 'dfs':
-        return depth_first_search(problem)
+        return depth_first_search(problem, stats)
     elif algo_name == 'ucs':
-        return uniform_cost_search(problem)
+        return uniform_cost_search(problem, stats)
     elif algo_name == 'astar':
-        return a_star_search(problem, heuristic)
+        return a_star_search(problem, get_heuristic(heuristic), stats)
+    elif algo_name == 'hda':
+        return parallel_a_star_search(problem, get_heuristic(heuristic), workers)
+    elif algo_name == 'anytime':
+        solution = None
+        for solution in anytime_search(problem, get_heuristic(heuristic), time_limit or ANYTIME_TIME_LIMIT,
+                                       stats=stats):
+            pass
+        return solution
+    elif algo_name == 'ida':
+        return ida_star_search(problem, get_heuristic(heuristic), table_bytes or IDA_TABLE_BYTES, stats)
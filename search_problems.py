@@ -1,4 +1,7 @@
 from abc import ABC, abstractmethod
+from bitboard import FillState
+from flood_fill import flood_fill
+from region_graph import RegionGraph
 
 
 class SearchProblem(ABC):
@@ -27,22 +30,36 @@ class SearchProblem(ABC):
 
 
 class FillProblem(SearchProblem):
+    """
+    Models the game as a search problem over compact FillState objects.
+    All states share one immutable copy of the board, so successors never copy the grid.
+    If compress is True, the board is first collapsed into a RegionGraph and the search runs
+    over RegionState objects instead, where each move is a union over region neighbors.
+    If prune is True, only colors present on the frontier are expanded, and if forced_moves is also True,
+    a color that can be eliminated in one move is played without trying the others.
+    """
 
-    def __init__(self, board):
+    def __init__(self, board, compress=False, prune=True, forced_moves=False):
         super().__init__(board)
         self.expanded = 0
+        self.generated = 0
+        self.prune = prune
+        self.forced_moves = forced_moves
+        if compress:
+            self.start_state = RegionGraph(board).start_state()
+        else:
+            self.start_state = FillState.from_board(board)
 
     def get_start_state(self):
-        return self.board
+        return self.start_state
 
     def get_successors(self, state):
-        moves = state.COLORS
+        moves = state.moves(self.forced_moves) if self.prune else state.COLORS
         self.expanded += 1
+        self.generated += len(moves)
         successors = []
         for move in moves:
-            successor = state.copy()
-            successor.apply_color_move(move)
-            successors.append((successor, move, 1))
+            successors.append((state.successor(move), move, 1))
         return successors
 
     def is_goal_state(self, state):
@@ -78,3 +95,12 @@ class FindConqueredProblem(SearchProblem):
     def is_goal_state(self, state):
         """Always returns False in order to allow the search algorithm to find all nodes"""
         return False
+
+    def conquered(self, span=True):
+        """
+        Returns a set of every node reachable from the start state, found with the flood fill engine
+        instead of a generic graph search
+        :param span: If True, the adjacent neighborhood is filled with the scanline span fill
+        """
+        row, col = self.get_start_state()
+        return flood_fill(self.board, [(row, col)], self.board.board[row][col], knight=self.knight_mode, span=span)
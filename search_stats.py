@@ -0,0 +1,115 @@
+import json
+from time import perf_counter
+
+
+class SearchStats:
+    """
+    Counters and timers of one search. The search functions take an optional SearchStats object, and
+    none of this is done when they are not given one, so an uninstrumented search pays a single
+    'is None' check per expanded node.
+    Reports:
+        (1) Nodes expanded and generated
+        (2) Duplicates: generated states that were already visited and not searched again
+        (3) The peak size of the open list (the current path for IDA*, the beam for the anytime search)
+        (4) Seconds spent generating successors and evaluating the heuristic. The Zobrist key of a state is updated
+            as part of generating it, so its hashing is counted with the successors
+        (5) Optionally, the number of nodes expanded at each depth
+    A hook, if given, is called as hook(event, stats, state) on every 'expand' event and once on 'finish',
+    which is enough to drive a sampling profiler or a progress display.
+    """
+
+    def __init__(self, histograms=False, hook=None):
+        self.histograms = histograms
+        self.hook = hook
+        self.expanded = 0
+        self.generated = 0
+        self.duplicates = 0
+        self.peak_open = 0
+        self.successor_seconds = 0.0
+        self.heuristic_seconds = 0.0
+        self.expanded_by_depth = {}
+        self.start_time = None
+        self.seconds = None
+
+    def instrument(self, problem, heuristic=None):
+        """
+        Starts the clock and returns the problem and heuristic wrapped so that their calls are timed.
+        The heuristic may also be a batched one, as returned by heuristics.batch_heuristic
+        :return: A (problem, heuristic) pair to search with instead of the given ones
+        """
+        self.start_time = perf_counter()
+        if heuristic is None:
+            return InstrumentedProblem(problem, self), None
+
+        def timed_heuristic(*args):
+            start = perf_counter()
+            value = heuristic(*args)
+            self.heuristic_seconds += perf_counter() - start
+            return value
+        return InstrumentedProblem(problem, self), timed_heuristic
+
+    def expand(self, state, depth, open_size):
+        """
+        Records the expansion of a state
+        :param depth: The depth of the state, or None if the search does not keep track of it
+        :param open_size: The current size of the open list
+        """
+        self.expanded += 1
+        if open_size > self.peak_open:
+            self.peak_open = open_size
+        if self.histograms and depth is not None:
+            self.expanded_by_depth[depth] = self.expanded_by_depth.get(depth, 0) + 1
+        if self.hook is not None:
+            self.hook('expand', self, state)
+
+    def finish(self):
+        """Stops the clock and calls the hook with the 'finish' event"""
+        if self.start_time is not None:
+            self.seconds = perf_counter() - self.start_time
+        if self.hook is not None:
+            self.hook('finish', self, None)
+
+    def as_dict(self):
+        """Returns the statistics as a dict of JSON types"""
+        stats = {
+            'expanded': self.expanded,
+            'generated': self.generated,
+            'duplicates': self.duplicates,
+            'peak_open': self.peak_open,
+            'seconds': self.seconds,
+            'successor_seconds': self.successor_seconds,
+            'heuristic_seconds': self.heuristic_seconds,
+        }
+        if self.histograms:
+            stats['expanded_by_depth'] = {str(depth): count for depth, count in sorted(self.expanded_by_depth.items())}
+        return stats
+
+    def to_json(self, path=None):
+        """Returns the statistics as a JSON string, and writes it to the file at the given path if there is one"""
+        text = json.dumps(self.as_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as stats_file:
+                stats_file.write(text)
+        return text
+
+
+class InstrumentedProblem:
+    """
+    Wraps a search problem to time its successor generation and to count the successors.
+    Every other attribute is read from the wrapped problem.
+    """
+
+    def __init__(self, problem, stats):
+        self.problem = problem
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+    def get_successors(self, state):
+        stats = self.stats
+        start = perf_counter()
+        successors = self.problem.get_successors(state)
+        stats.successor_seconds += perf_counter() - start
+        stats.generated += len(successors)
+        return successors
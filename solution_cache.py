@@ -0,0 +1,134 @@
+"""
+A cache of the best known solution of every position that was solved, shared across runs.
+Positions are cached under a canonical form, so a position is found again when it comes back transposed
+(along with its starting point) or with its colors renamed: of the board and its transpose, each with its
+colors renamed in the order they first appear row by row, the one with the smallest record is the canonical one.
+Solutions are stored in the colors of the canonical form and renamed back on lookup.
+"""
+import hashlib
+import sqlite3
+from collections import OrderedDict
+from threading import Lock
+from board import Board
+from board_format import encode_board
+
+
+def canonical_form(board):
+    """
+    Returns the canonical form of the position of the given board
+    :param board: A Board or a NumpyBoard. Any other board or search state is read through its to_board()
+    :return: A (key, renaming) pair of a 16-byte digest of the canonical form, and a dict from each color
+    of the board to its color in the canonical form
+    """
+    if not hasattr(board, 'joker_locations'):
+        board = board.to_board()
+    best = None
+    for orientation in (board, board.transpose_board()):
+        grid = [[orientation.color_at(row, col) for col in range(orientation.width)]
+                for row in range(orientation.height)]
+        renaming = {}
+        for color in (color for grid_row in grid for color in grid_row):
+            if color not in renaming:
+                renaming[color] = Board.PALETTE[len(renaming)]
+        for color in Board.PALETTE:  # Colors missing from the board are renamed in palette order
+            if color not in renaming:
+                renaming[color] = Board.PALETTE[len(renaming)]
+        candidate = Board((orientation.height, orientation.width), orientation.starting_point, copy=True)
+        candidate.board = [[renaming[color] for color in grid_row] for grid_row in grid]
+        candidate.joker_locations = orientation.joker_locations
+        candidate.mode = board.mode
+        record = encode_board(candidate)
+        if best is None or record < best[0]:
+            best = record, renaming
+    return hashlib.blake2b(best[0], digest_size=16).digest(), best[1]
+
+
+class SolutionCache:
+    """
+    Keeps the best known solution of each canonical position, and whether it is proven optimal.
+    The most recently used entries are kept in memory, up to capacity, and every entry is also kept in an
+    SQLite file when a path is given, so later runs and other processes find it too.
+    A solution replaces the cached one only if it is shorter, or as long and proven optimal.
+    Safe to use from several threads
+    """
+
+    CAPACITY = 100000
+
+    _cache = {}
+
+    def __init__(self, path=None, capacity=CAPACITY):
+        self.capacity = capacity
+        self.entries = OrderedDict()  # Key=Canonical key, Value=(moves in the canonical colors, optimal)
+        self.lock = Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self.db.execute('CREATE TABLE IF NOT EXISTS solutions (key BLOB PRIMARY KEY, moves TEXT, optimal INTEGER)')
+            self.db.commit()
+
+    @classmethod
+    def get(cls, path):
+        """Returns the shared cache of the given SQLite file"""
+        if path not in cls._cache:
+            cls._cache[path] = cls(path)
+        return cls._cache[path]
+
+    def __entry(self, key):
+        """Returns the (moves, optimal) entry of the canonical key from memory or from the file, or None"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            return entry
+        if self.db is not None:
+            row = self.db.execute('SELECT moves, optimal FROM solutions WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                entry = row[0], bool(row[1])
+                self.__remember(key, entry)
+        return entry
+
+    def __remember(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def lookup(self, board, optimal=False):
+        """
+        Returns the best known solution of the board's position as a list of colors, or None
+        :param optimal: If True, only a solution that is proven optimal is returned
+        """
+        key, renaming = canonical_form(board)
+        with self.lock:
+            entry = self.__entry(key)
+        if entry is None or (optimal and not entry[1]):
+            return None
+        original = {canonical: color for color, canonical in renaming.items()}
+        return [original[move] for move in entry[0]]
+
+    def store(self, board, moves, optimal=False):
+        """
+        Caches the solution of the board's position, unless a better one is already known
+        :param moves: The solution as a sequence of colors
+        :param optimal: True iff the solution is proven to have the fewest moves
+        """
+        key, renaming = canonical_form(board)
+        moves = ''.join(renaming[move] for move in moves)
+        with self.lock:
+            entry = self.__entry(key)
+            if entry is not None:
+                if len(entry[0]) < len(moves) or (len(entry[0]) == len(moves) and (entry[1] or not optimal)):
+                    return
+            self.__remember(key, (moves, optimal))
+            if self.db is not None:  # Another process may have stored a better solution since, so the file checks too
+                self.db.execute('INSERT INTO solutions VALUES (?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                                'moves = excluded.moves, optimal = excluded.optimal '
+                                'WHERE length(excluded.moves) < length(moves) OR '
+                                '(length(excluded.moves) = length(moves) AND excluded.optimal > optimal)',
+                                (key, moves, int(optimal)))
+                self.db.commit()
+
+    def __len__(self):
+        if self.db is not None:
+            with self.lock:
+                return self.db.execute('SELECT COUNT(*) FROM solutions').fetchone()[0]
+        return len(self.entries)
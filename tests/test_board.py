@@ -0,0 +1,22 @@
+import random
+import pytest
+from board import Board
+from numpy_board import NumpyBoard
+
+
+@pytest.mark.parametrize('board_class', [Board, NumpyBoard])
+def test_transpose_rectangular_board(board_class):
+    random.seed(0)
+    board = board_class((3, 5), (1, 4), jokers=2)
+    transposed = board.transpose_board()
+    assert (transposed.height, transposed.width) == (5, 3)
+    assert transposed.starting_point == (4, 1)
+    assert transposed.joker_locations == {(col, row) for row, col in board.joker_locations}
+    for row in range(board.height):
+        for col in range(board.width):
+            assert transposed.color_at(col, row) == board.color_at(row, col)
+
+    color = next(color for color in Board.PALETTE if color != board.color_at(1, 4))
+    board.apply_color_move(color)
+    transposed.apply_color_move(color)
+    assert transposed.conquered_cells() == {(col, row) for row, col in board.conquered_cells()}
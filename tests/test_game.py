@@ -0,0 +1,12 @@
+import random
+from game import Game
+
+
+def test_anytime_search_out_of_time(capsys):
+    random.seed(0)
+    game = Game((60, 60), num_jokers=0)
+    before = [row[:] for row in game.board.board]
+    game.run_search_agent_game('anytime', 'weighted', time_limit=1e-9)
+    assert Game.NO_SOLUTION_MSG in capsys.readouterr().out
+    assert game.move_num == 0
+    assert game.board.board == before
@@ -0,0 +1,35 @@
+from random import Random
+
+
+class ZobristTable:
+    """
+    Random 64-bit keys for every (cell, value) pair of a board with the given number of cells.
+    A position is hashed by XOR-ing together the keys of its (cell, value) pairs, so when a cell
+    changes value the hash is updated with two XORs instead of being recomputed from the whole board.
+    Tables are cached and seeded by their shape, so boards of the same size share the same keys
+    and the global random state is left untouched.
+    """
+
+    _cache = {}
+
+    def __init__(self, size, values):
+        rng = Random(f'zobrist-{size}-{values}')
+        self.keys = [[rng.getrandbits(64) for _ in range(values)] for _ in range(size)]
+
+    @classmethod
+    def get(cls, size, values):
+        """Returns the shared table for the given number of cells and values per cell"""
+        key = (size, values)
+        if key not in cls._cache:
+            cls._cache[key] = cls(size, values)
+        return cls._cache[key]
+
+    def mask_key(self, mask, value):
+        """Returns the XOR of the given value's key over every cell set in the bitmask"""
+        keys = self.keys
+        result = 0
+        while mask:
+            low = mask & -mask
+            result ^= keys[low.bit_length() - 1][value]
+            mask ^= low
+        return result